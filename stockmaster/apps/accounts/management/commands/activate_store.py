@@ -0,0 +1,31 @@
+import logging
+from django.core.management.base import BaseCommand
+from apps.accounts.models import ShopifyStore
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Activate a Shopify store by ID'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--id',
+            type=int,
+            required=True,
+            help='ID of the store to activate',
+        )
+
+    def handle(self, *args, **options):
+        store_id = options['id']
+        
+        # A single UPDATE; the row count tells us whether the store exists
+        updated = ShopifyStore.objects.filter(id=store_id).update(is_active=True)
+        if not updated:
+            self.stdout.write(self.style.ERROR(f"Store with ID {store_id} not found."))
+            return
+        
+        shop_url = ShopifyStore.objects.values_list('shop_url', flat=True).get(id=store_id)
+        # update() skips post_save, so drop the cached store copies ourselves
+        ShopifyStore.invalidate_cache(shop_url)
+        
+        self.stdout.write(self.style.SUCCESS(f"Store {shop_url} (ID: {store_id}) activated successfully."))
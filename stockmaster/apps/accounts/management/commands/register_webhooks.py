@@ -1,8 +1,9 @@
 import logging
 from django.core.management.base import BaseCommand
 from django.conf import settings
-from apps.accounts.models import ShopifyStore
+from apps.accounts.models import ShopifyStore, ShopifyWebhook
 from core.shopify.client import ShopifyClient
+from core.shopify.webhooks import WEBHOOK_TOPICS, WEBHOOK_ADDRESSES
 
 logger = logging.getLogger(__name__)
 
@@ -10,7 +11,7 @@ class Command(BaseCommand):
     help = 'Register required webhooks for all active stores'
 
     def handle(self, *args, **options):
-        stores = ShopifyStore.objects.filter(is_active=True)
+        stores = ShopifyStore.objects.filter(is_active=True).only('id', 'shop_url', 'access_token')
         
         if not stores.exists():
             self.stdout.write(self.style.WARNING('No active stores found'))
@@ -18,15 +19,10 @@ class Command(BaseCommand):
         
         self.stdout.write(f'Registering webhooks for {stores.count()} stores')
         
-        webhook_topics = [
-            'app/uninstalled',
-            'products/update',
-            'inventory_levels/update'
-        ]
+        created_webhooks = []
         
-        base_url = settings.APP_URL.rstrip('/')
-        
-        for store in stores:
+        # Stream stores through a server-side cursor instead of loading them all
+        for store in stores.iterator(chunk_size=500):
             self.stdout.write(f'Processing store: {store.shop_url}')
             
             if not store.access_token:
@@ -48,29 +44,47 @@ class Command(BaseCommand):
                 self.stdout.write(self.style.ERROR(f'Error getting webhooks for {store.shop_url}: {str(e)}'))
                 continue
             
-            # Register required webhooks if they don't exist
-            for topic in webhook_topics:
+            # Work out which required webhooks are missing
+            missing_webhooks = {}
+            for topic in WEBHOOK_TOPICS:
                 if topic in existing_webhook_topics:
                     self.stdout.write(f'Webhook for {topic} already exists. Skipping.')
                     continue
                 
-                # Convert topic format: app/uninstalled -> app_uninstalled
-                endpoint_name = topic.replace('/', '_')
-                
-                # Different webhook paths based on the topic
-                if topic == 'app/uninstalled':
-                    webhook_url = f'{base_url}/webhooks/{endpoint_name}'
+                missing_webhooks[topic] = WEBHOOK_ADDRESSES[topic]
+            
+            if not missing_webhooks:
+                continue
+            
+            # Register all missing webhooks in one GraphQL round trip
+            try:
+                webhook_ids = client.create_webhooks_bulk(missing_webhooks)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f'Error registering webhooks for {store.shop_url}: {str(e)}'))
+                continue
+            
+            for topic, webhook_url in missing_webhooks.items():
+                if topic in webhook_ids:
+                    created_webhooks.append(ShopifyWebhook(
+                        store=store,
+                        webhook_id=webhook_ids[topic],
+                        topic=topic,
+                        address=webhook_url,
+                        format='json'
+                    ))
+                    self.stdout.write(self.style.SUCCESS(f'Registered webhook for {topic} at {webhook_url}'))
                 else:
-                    # Use the standard webhook paths for other topics
-                    webhook_url = f'{base_url}/webhooks/{topic.split("/")[0]}/{topic.split("/")[1]}'
-                
-                try:
-                    response = client.create_webhook(topic, webhook_url)
-                    if 'webhook' in response:
-                        self.stdout.write(self.style.SUCCESS(f'Registered webhook for {topic} at {webhook_url}'))
-                    else:
-                        self.stdout.write(self.style.ERROR(f'Failed to register webhook for {topic}: {response}'))
-                except Exception as e:
-                    self.stdout.write(self.style.ERROR(f'Error registering webhook for {topic}: {str(e)}'))
+                    self.stdout.write(self.style.ERROR(f'Failed to register webhook for {topic}'))
+        
+        # Record all newly registered webhooks in a single upsert; a re-created subscription
+        # replaces the dead one recorded for its topic, as in setup_webhooks
+        if created_webhooks:
+            ShopifyWebhook.objects.bulk_create(
+                created_webhooks,
+                batch_size=500,
+                update_conflicts=True,
+                unique_fields=['store', 'topic'],
+                update_fields=['webhook_id', 'address', 'format'],
+            )
         
         self.stdout.write(self.style.SUCCESS('Webhook registration completed')) 
\ No newline at end of file
@@ -1,6 +1,6 @@
 import logging
 from django.core.management.base import BaseCommand
-from django.db import connection
+from django.db import DatabaseError, connection, transaction
 from django.conf import settings
 
 logger = logging.getLogger(__name__)
@@ -13,22 +13,29 @@ class Command(BaseCommand):
         
         # 1. SQL fixes - update any places in the database with the old name
         try:
-            with connection.cursor() as cursor:
-                # Query to find tables/columns where 'SmartShelf' might be stored
-                cursor.execute("""
-                    UPDATE django_session 
-                    SET session_data = REPLACE(session_data, 'SmartShelf', 'StockMaster')
-                    WHERE session_data LIKE '%SmartShelf%';
-                """)
-                self.stdout.write(f"Updated {cursor.rowcount} session records")
-                
-                # Update any site settings if they exist
-                cursor.execute("""
-                    UPDATE django_site 
-                    SET name = REPLACE(name, 'SmartShelf', 'StockMaster')
-                    WHERE name LIKE '%SmartShelf%';
-                """)
-                self.stdout.write(f"Updated {cursor.rowcount} site records")
+            # Run all updates in one transaction so they commit (and release locks) together
+            with transaction.atomic(), connection.cursor() as cursor:
+                # Sessions and sites may not be stored in the database; a savepoint per
+                # optional table keeps a missing one from rolling back the rest
+                optional_updates = (
+                    ('session', """
+                        UPDATE django_session 
+                        SET session_data = REPLACE(session_data, 'SmartShelf', 'StockMaster')
+                        WHERE session_data LIKE '%SmartShelf%';
+                    """),
+                    ('site', """
+                        UPDATE django_site 
+                        SET name = REPLACE(name, 'SmartShelf', 'StockMaster')
+                        WHERE name LIKE '%SmartShelf%';
+                    """),
+                )
+                for label, sql in optional_updates:
+                    try:
+                        with transaction.atomic():
+                            cursor.execute(sql)
+                        self.stdout.write(f"Updated {cursor.rowcount} {label} records")
+                    except DatabaseError as e:
+                        self.stdout.write(self.style.WARNING(f"Skipped {label} records: {str(e)}"))
                 
                 # Update any stored shop data
                 cursor.execute("""
@@ -40,6 +47,7 @@ class Command(BaseCommand):
                 
         except Exception as e:
             self.stdout.write(self.style.ERROR(f"Database error: {str(e)}"))
+            return
                 
         self.stdout.write(self.style.SUCCESS('App rename completed successfully'))
         
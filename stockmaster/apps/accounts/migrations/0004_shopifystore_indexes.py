@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-16 12:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_shopifystore_last_sync_at_shopifystore_sync_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='shopifystore',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['shop_url', 'is_active'], name='shop_active_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-16 13:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_shopifystore_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='shopifywebhook',
+            index=models.Index(fields=['store', 'topic'], name='accounts_sh_store_i_dd6bef_idx'),
+        ),
+    ]
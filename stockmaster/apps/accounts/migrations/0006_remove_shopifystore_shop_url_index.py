@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-16 13:01
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_shopifywebhook_store_topic_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='shopifystore',
+            name='accounts_sh_shop_ur_52337b_idx',
+        ),
+    ]
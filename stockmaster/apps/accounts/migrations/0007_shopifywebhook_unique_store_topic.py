@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-16 13:04
+
+from django.db import migrations
+from django.db.models import Max
+
+
+def remove_duplicate_topics(apps, schema_editor):
+    """Keep only the newest webhook row per (store, topic) before adding the constraint."""
+    ShopifyWebhook = apps.get_model('accounts', 'ShopifyWebhook')
+    keep_ids = (
+        ShopifyWebhook.objects.values('store', 'topic')
+        .annotate(keep_id=Max('id'))
+        .values_list('keep_id', flat=True)
+    )
+    ShopifyWebhook.objects.exclude(id__in=list(keep_ids)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_remove_shopifystore_shop_url_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_topics, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='shopifywebhook',
+            name='accounts_sh_store_i_dd6bef_idx',
+        ),
+        migrations.AlterUniqueTogether(
+            name='shopifywebhook',
+            unique_together={('store', 'webhook_id'), ('store', 'topic')},
+        ),
+    ]
@@ -1,6 +1,25 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
+from django.core.cache import cache
+
+# Minimum seconds between last_access writes for one store
+LAST_ACCESS_THROTTLE = 300
+
+class ShopifyStoreQuerySet(models.QuerySet):
+    """QuerySet helpers for ShopifyStore."""
+    
+    def with_webhooks(self):
+        """Prefetch each store's recorded webhooks in one extra query."""
+        return self.prefetch_related(models.Prefetch(
+            'webhooks',
+            queryset=ShopifyWebhook.objects.only('store_id', 'topic', 'webhook_id', 'address'),
+        ))
+
+
+class ShopifyStoreManager(models.Manager.from_queryset(ShopifyStoreQuerySet)):
+    """Manager for ShopifyStore; use .with_webhooks() on store lists that touch webhooks."""
+
 
 class ShopifyStore(models.Model):
     """Model to store Shopify store information and credentials."""
@@ -39,12 +58,17 @@ class ShopifyStore(models.Model):
     last_access = models.DateTimeField(default=timezone.now, 
                                       help_text="The last time the store accessed the app")
     
+    objects = ShopifyStoreManager()
+    
     class Meta:
         verbose_name = "Shopify Store"
         verbose_name_plural = "Shopify Stores"
         indexes = [
-            models.Index(fields=['shop_url']),
+            # shop_url needs no plain index of its own: unique=True already creates one
             models.Index(fields=['is_active']),
+            # Auth lookups only ever want active stores
+            models.Index(fields=['shop_url', 'is_active'], name='shop_active_idx',
+                         condition=models.Q(is_active=True)),
         ]
     
     def __str__(self):
@@ -65,10 +89,38 @@ class ShopifyStore(models.Model):
         delta = self.trial_ends_at - timezone.now()
         return max(0, delta.days)
     
+    @staticmethod
+    def cache_key(shop_url):
+        """Cache key for the lightweight store lookup used by the auth views."""
+        return f"shopifystore:{shop_url}"
+    
+    @staticmethod
+    def dashboard_cache_key(shop_url):
+        """Cache key for the full store record read by the dashboard."""
+        return f"shopifystore:dashboard:{shop_url}"
+    
+    @staticmethod
+    def invalidate_cache(shop_url):
+        """Drop every cached copy of a store; needed after writes that bypass post_save."""
+        cache.delete_many([ShopifyStore.cache_key(shop_url), ShopifyStore.dashboard_cache_key(shop_url)])
+    
     def update_last_access(self):
-        """Update the last access timestamp."""
-        self.last_access = timezone.now()
-        self.save(update_fields=['last_access'])
+        """Update the last access timestamp (at most once per LAST_ACCESS_THROTTLE seconds)."""
+        if ShopifyStore.touch_last_access(self.pk):
+            self.last_access = timezone.now()
+    
+    @staticmethod
+    def touch_last_access(store_id):
+        """
+        Bump last_access for a store unless it was bumped recently.
+        
+        Uses update() so neither post_save nor the updated_at auto_now fire.
+        Returns True if a write was issued.
+        """
+        if not cache.add(f"last_access:{store_id}", 1, LAST_ACCESS_THROTTLE):
+            return False
+        ShopifyStore.objects.filter(pk=store_id).update(last_access=timezone.now())
+        return True
 
 
 class ShopifyWebhook(models.Model):
@@ -84,7 +136,8 @@ class ShopifyWebhook(models.Model):
     class Meta:
         verbose_name = "Shopify Webhook"
         verbose_name_plural = "Shopify Webhooks"
-        unique_together = ('store', 'webhook_id')
+        # (store, topic) also serves as the index for the per-topic webhook lookups
+        unique_together = (('store', 'webhook_id'), ('store', 'topic'))
     
     def __str__(self):
         return f"{self.store.shop_url} - {self.topic}" 
\ No newline at end of file
@@ -2,32 +2,52 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
+from django.db import transaction
 from core.utils.logger import logger
 from .models import ShopifyStore
 
 @receiver(post_save, sender=ShopifyStore)
-def create_user_for_store(sender, instance, created, **kwargs):
+def create_user_for_store(sender, instance, created, update_fields=None, **kwargs):
     """
     Create a user account for the store owner if one doesn't exist.
+    
+    The shop email is filled in after install by post_install_setup, so also
+    run when a save sets it. The user lookup runs after commit, outside the
+    transaction that saved the store.
     """
-    if created and instance.shop_email and not instance.user:
-        try:
-            # Check if a user with this email already exists
-            user = User.objects.filter(email=instance.shop_email).first()
-            
-            if not user:
-                # Create a new user with the store's email
-                username = instance.shop_url.split('.')[0]
-                user = User.objects.create_user(
-                    username=username,
-                    email=instance.shop_email,
-                    password=None  # No password needed, using Shopify auth
-                )
-                logger.info(f"Created user {username} for store {instance.shop_url}")
-            
-            # Associate the user with the store
-            instance.user = user
-            instance.save(update_fields=['user'])
-            
-        except Exception as e:
-            logger.error(f"Error creating user for store {instance.shop_url}: {str(e)}") 
\ No newline at end of file
+    email_saved = created or (update_fields is not None and 'shop_email' in update_fields)
+    if email_saved and instance.shop_email and not instance.user:
+        transaction.on_commit(lambda: _link_store_user(instance))
+
+
+def _link_store_user(instance):
+    """Find or create the owner's user by email and link it to the store."""
+    try:
+        # Check if a user with this email already exists
+        user = User.objects.filter(email=instance.shop_email).only('id', 'email').first()
+        
+        if not user:
+            # Create a new user with the store's email
+            username = instance.shop_url.split('.')[0]
+            user = User.objects.create_user(
+                username=username,
+                email=instance.shop_email,
+                password=None  # No password needed, using Shopify auth
+            )
+            logger.info("Created user %s for store %s", username, instance.shop_url)
+        
+        # Associate the user with the store; update() writes once and skips post_save
+        ShopifyStore.objects.filter(pk=instance.pk).update(user=user)
+        instance.user = user
+        
+    except Exception as e:
+        logger.error("Error creating user for store %s: %s", instance.shop_url, e)
+
+
+@receiver(post_save, sender=ShopifyStore)
+def invalidate_store_cache(sender, instance, **kwargs):
+    """
+    Drop the cached store copies so the auth views never serve a stale token
+    and the dashboard never shows a stale sync status.
+    """
+    ShopifyStore.invalidate_cache(instance.shop_url)
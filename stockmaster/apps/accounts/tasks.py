@@ -0,0 +1,49 @@
+from celery import shared_task
+
+from core.shopify.client import ShopifyClient
+from core.utils.logger import logger
+from .models import ShopifyStore
+
+
+@shared_task
+def post_install_setup(store_id):
+    """
+    Finish installing a store outside the OAuth request cycle.
+
+    Registers the required webhooks and fills in the shop name and email,
+    so the auth callback only has to exchange the code for a token.
+
+    Args:
+        store_id (int): The store ID
+
+    Returns:
+        dict: Summary of operations performed
+    """
+    # Imported here because the views enqueue this task
+    from .views import get_shop_details, setup_webhooks
+
+    try:
+        store = ShopifyStore.objects.with_webhooks().get(id=store_id)
+    except ShopifyStore.DoesNotExist:
+        logger.error("[Post Install] Store %s not found", store_id)
+        return {'status': 'error', 'message': f"Store {store_id} not found"}
+
+    try:
+        client = ShopifyClient(store.shop_url, store.access_token)
+        setup_webhooks(client, store)
+        logger.info("[Post Install] Webhook setup completed for store ID: %s", store.id)
+    except Exception as e:
+        logger.error("[Post Install] Error setting up webhooks for store %s: %s", store.id, e, exc_info=True)
+
+    # Re-installs already have the details; skip the Shopify round trip
+    if store.shop_name and store.shop_email:
+        return {'status': 'success', 'store_id': store.id}
+
+    shop_details = get_shop_details(store.shop_url, store.access_token)
+    if shop_details:
+        store.shop_name = shop_details.get('name', store.shop_url)
+        store.shop_email = shop_details.get('email')
+        store.save(update_fields=['shop_name', 'shop_email'])
+        logger.info("[Post Install] Shop details - Name: %s, Email: %s", store.shop_name, store.shop_email)
+
+    return {'status': 'success', 'store_id': store.id}
@@ -2,29 +2,86 @@ import secrets
 import datetime
 from django.shortcuts import render, redirect
 from django.views import View
-from django.urls import reverse
-from django.http import HttpResponseRedirect, HttpResponse, JsonResponse
+from django.http import HttpResponse
 from django.conf import settings
-from django.contrib import messages
 from django.utils import timezone
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.cache import cache_page
+from django.views.decorators.vary import vary_on_cookie
+from django.core.cache import cache
+from django.db import transaction
 import logging
 import requests
 import json
 import hmac
 import hashlib
-import base64
-import os
-import time
 import urllib.parse
+from functools import partial
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from .models import ShopifyStore, ShopifyWebhook
 from core.shopify.client import ShopifyClient
+from core.shopify.webhooks import WEBHOOK_TOPICS, WEBHOOK_ADDRESSES
 from core.utils.logger import logger
 from apps.inventory.tasks import sync_store_data
+from .tasks import post_install_setup
 
-logger = logging.getLogger(__name__)
+
+# How long the lightweight store lookup stays cached (seconds)
+STORE_CACHE_TIMEOUT = 300
+
+# How long fetched shop details stay cached (seconds)
+SHOP_DETAILS_CACHE_TIMEOUT = 300
+
+# Shared HTTP session so TLS connections to *.myshopify.com are reused
+_SHOPIFY_HTTP = requests.Session()
+_SHOPIFY_HTTP.mount('https://', HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=64,
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504]),
+))
+
+# OAuth authorize URL with everything but the shop and state encoded once at import.
+# IMPORTANT: redirect_uri must be the exact callback URL registered in Shopify (with trailing slash)
+_AUTH_QS = urllib.parse.urlencode({
+    'client_id': settings.SHOPIFY_CLIENT_ID,
+    'scope': settings.SHOPIFY_API_SCOPES,
+    'redirect_uri': f"{settings.APP_URL}/auth/callback/",
+})
+_AUTH_TMPL = "https://{shop}/admin/oauth/authorize?" + _AUTH_QS + "&state={state}"
+
+# Keyed HMAC prototype; each verification works on a .copy() of it
+_HMAC_KEY = (settings.SHOPIFY_CLIENT_SECRET or '').encode('utf-8')
+_HMAC_PROTO = hmac.new(_HMAC_KEY, digestmod=hashlib.sha256)
+
+# App credentials for the token exchange, read from settings once
+_TOKEN_CREDENTIALS = {
+    "client_id": settings.SHOPIFY_CLIENT_ID,
+    "client_secret": settings.SHOPIFY_CLIENT_SECRET,
+}
+
+# Shop details query, serialized once
+_SHOP_DETAILS_QUERY = "{ shop { name email myshopifyDomain } }"
+_SHOP_DETAILS_BODY = json.dumps({"query": _SHOP_DETAILS_QUERY}).encode('utf-8')
+
+# How long the static (no ?shop=) login and landing pages are cached (seconds)
+STATIC_PAGE_CACHE_TIMEOUT = 300
+
+
+@cache_page(STATIC_PAGE_CACHE_TIMEOUT, cache='default')
+@vary_on_cookie
+def _login_page(request):
+    """Render the shop-entry login form; cached per session cookie."""
+    return render(request, 'accounts/login.html')
+
+
+@cache_page(STATIC_PAGE_CACHE_TIMEOUT, cache='default')
+@vary_on_cookie
+def _landing_page(request):
+    """Render the generic landing page; cached per session cookie."""
+    return render(request, 'accounts/landing.html')
 
 
 def install_app(request):
@@ -33,29 +90,31 @@ def install_app(request):
     """
     shop = request.GET.get('shop')  # e.g. my-store.myshopify.com
     if not shop:
-        return render(request, 'accounts/login.html')
+        return _login_page(request)
     
     # Normalize shop URL
     if not shop.endswith('.myshopify.com'):
         shop = f"{shop}.myshopify.com"
     
+    # Check if we already have a token for this shop
+    store = get_store_cached(shop)
+    if store and store['access_token']:
+        # Store exists and has a token, update session
+        request.session['shop'] = shop
+        ShopifyStore.touch_last_access(store['id'])
+        return redirect('dashboard:index')
+    # Otherwise the store doesn't exist yet and will be created during callback
+    
     # Generate a state parameter to prevent CSRF
-    state = secrets.token_hex(16)
+    state = create_nonce()
     request.session['shopify_auth_state'] = state
     request.session['shopify_shop'] = shop
     
-    # Build redirection URL with proper components
-    api_key = settings.SHOPIFY_CLIENT_ID
-    scopes = settings.SHOPIFY_API_SCOPES
-    
-    # IMPORTANT: Use the exact callback URL registered in Shopify (with trailing slash)
-    redirect_uri = "https://cloud-549585597.onetsolutions.network/auth/callback/"
-    
-    # Construct the install URL with URLEncoded redirect URI
-    install_url = f"https://{shop}/admin/oauth/authorize?client_id={api_key}&scope={scopes}&redirect_uri={urllib.parse.quote(redirect_uri)}&state={state}"
+    # Construct the install URL
+    install_url = _AUTH_TMPL.format(shop=shop, state=state)
     
     # Log the URL for debugging
-    logger.info(f"Redirecting to Shopify OAuth URL: {install_url}")
+    logger.info("Redirecting to Shopify OAuth URL: %s", install_url)
     
     return redirect(install_url)
 
@@ -69,61 +128,75 @@ def auth_callback(request):
     code = request.GET.get('code')
     shop = request.GET.get('shop')
     state = request.GET.get('state')
-    hmac = request.GET.get('hmac')
+    hmac_value = request.GET.get('hmac')
     
-    logger.info(f"[Callback] Received - Shop: {shop}, State: {state}, Code: {bool(code)}, HMAC: {bool(hmac)}")
+    logger.info("[Callback] Received - Shop: %s, State: %s, Code: %s, HMAC: %s", shop, state, bool(code), bool(hmac_value))
     
     # 1. Validate state
     stored_state = request.session.get('shopify_auth_state')
     if not state or state != stored_state:
-        logger.error(f"[Callback] State mismatch: Expected {stored_state}, Got {state}")
+        logger.error("[Callback] State mismatch: Expected %s, Got %s", stored_state, state)
         return render(request, 'accounts/error.html', {'error': 'Invalid state parameter'})
     logger.info("[Callback] State validation successful.")
     
     # 2. Verify HMAC
-    if not hmac_is_valid(request.GET):
-        logger.error(f"[Callback] HMAC verification failed.")
+    if not hmac_is_valid(request):
+        logger.error("[Callback] HMAC verification failed.")
         return render(request, 'accounts/error.html', {'error': 'HMAC verification failed'})
     logger.info("[Callback] HMAC verification successful.")
 
     # 3. Exchange code for access token
     access_token = exchange_code_for_token(shop, code)
     if not access_token:
-        logger.error(f"[Callback] Failed to exchange code for access token for shop: {shop}")
+        logger.error("[Callback] Failed to exchange code for access token for shop: %s", shop)
         return render(request, 'accounts/error.html', {'error': 'Failed to get access token'})
-    logger.info(f"[Callback] Successfully obtained access token for shop: {shop} (Token: {access_token[:5]}...{access_token[-5:]})")
-
-    # 4. Get shop details (Optional but good)
-    shop_details = get_shop_details(shop, access_token)
-    shop_name = shop_details.get('name', shop) if shop_details else shop
-    shop_email = shop_details.get('email') if shop_details else None
-    logger.info(f"[Callback] Shop details - Name: {shop_name}, Email: {shop_email}")
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("[Callback] Successfully obtained access token for shop: %s (Token: %s...%s)", shop, access_token[:5], access_token[-5:])
 
-    # 5. Save or Update Store Information in Database
+    # 4. Save or Update Store Information in Database
     store = None
     try:
-        store, created = ShopifyStore.objects.update_or_create(
-            shop_url=shop,
-            defaults={
-                'access_token': access_token,
-                'shop_name': shop_name,
-                'shop_email': shop_email,
-                'is_active': True, # Ensure it's active
-                'scopes': settings.SHOPIFY_API_SCOPES,
-                'last_access': timezone.now(),
-                'installed_at': timezone.now() if created else F('installed_at'),
-                'trial_ends_at': timezone.now() + datetime.timedelta(days=settings.TRIAL_DAYS) if created else None,
-                'sync_status': 'pending' # Set initial sync status
-            }
-        )
+        now = timezone.now()
+        with transaction.atomic():
+            # Lock the existing row so concurrent callbacks for one shop serialize
+            store = (ShopifyStore.objects.select_for_update()
+                     .only('id', 'shop_url', 'is_active', 'access_token')
+                     .filter(shop_url=shop).first())
+            created = store is None
+            if created:
+                store = ShopifyStore.objects.create(
+                    shop_url=shop,
+                    shop_name=shop, # Placeholder until post_install_setup fetches the real details
+                    access_token=access_token,
+                    is_active=True,
+                    scope=settings.SHOPIFY_API_SCOPES,
+                    last_access=now,
+                    trial_ends_at=now + datetime.timedelta(days=settings.TRIAL_DAYS),
+                    sync_status='pending',
+                )
+            else:
+                # Repeat installs only touch the columns that change, without signal fan-out
+                ShopifyStore.objects.filter(pk=store.pk).update(
+                    access_token=access_token,
+                    is_active=True, # Ensure it's active
+                    scope=settings.SHOPIFY_API_SCOPES,
+                    last_access=now,
+                    sync_status='pending', # Set initial sync status
+                    updated_at=now,
+                )
+                store.access_token = access_token
+                store.is_active = True
+            # Enqueue follow-up work only once the row is committed and visible to workers
+            transaction.on_commit(partial(queue_post_install_tasks, store.id))
+        ShopifyStore.invalidate_cache(shop)
         if store and store.id:
-            logger.info(f"[Callback][DB Save SUCCESS] {'Created' if created else 'Updated'} ShopifyStore record. ID: {store.id}, Shop: {store.shop_url}, Active: {store.is_active}, Token Saved: {bool(store.access_token)}")
+            logger.info("[Callback][DB Save SUCCESS] %s ShopifyStore record. ID: %s, Shop: %s, Active: %s, Token Saved: %s", 'Created' if created else 'Updated', store.id, store.shop_url, store.is_active, bool(store.access_token))
         else:
-            logger.error("[Callback][DB Save FAILED] update_or_create finished but store object or ID is invalid.")
+            logger.error("[Callback][DB Save FAILED] Save finished but store object or ID is invalid.")
             # Optionally raise an exception here or return error
 
     except Exception as e:
-        logger.error(f"[Callback][DB Save EXCEPTION] Error saving store {shop} to database: {str(e)}", exc_info=True)
+        logger.error("[Callback][DB Save EXCEPTION] Error saving store %s to database: %s", shop, e, exc_info=True)
         return render(request, 'accounts/error.html', {'error': 'Error processing store information in database.'})
 
     # Ensure we have a valid store object after saving
@@ -131,161 +204,191 @@ def auth_callback(request):
         logger.error("[Callback] Store object is invalid after DB save attempt. Cannot proceed.")
         return render(request, 'accounts/error.html', {'error': 'Failed to properly save store information.'})
 
-    # 6. Store necessary info in session for app usage
-    request.session['shop'] = store.shop_url
-    request.session['store_id'] = store.id
-    request.session.pop('shopify_auth_state', None) # Clean up state
-    request.session.pop('shopify_shop', None)
-    logger.info(f"[Callback] Session updated for store ID: {store.id}")
+    # 5. Store necessary info in session for app usage
+    # Mutate the session in one go; SessionMiddleware persists it once at response time
+    session = request.session
+    session.update({'shop': store.shop_url, 'store_id': store.id})
+    session.pop('shopify_auth_state', None) # Clean up state
+    session.pop('shopify_shop', None)
+    session.modified = True
+    logger.info("[Callback] Session updated for store ID: %s", store.id)
+
+    # 6. Redirect to app in Shopify Admin
+    admin_url = f"https://{shop}/admin/apps/{settings.SHOPIFY_CLIENT_ID}"
+    logger.info("[Callback] Redirecting to app main page: %s", admin_url)
+    return redirect(admin_url)
 
-    # 7. Setup Webhooks
+def queue_post_install_tasks(store_id):
+    """Queue webhook setup, shop details and the initial data sync for a store."""
+    # Setup webhooks and fetch shop details (Async)
     try:
-        client = ShopifyClient(shop, access_token)
-        setup_webhooks(client, store)
-        logger.info(f"[Callback] Webhook setup completed for store ID: {store.id}")
+        post_install_setup.apply_async((store_id,), queue='webhooks')
+        logger.info("[Callback] Queued post-install setup for store ID: %s", store_id)
     except Exception as e:
-        logger.error(f"[Callback] Error setting up webhooks for store {store.id}: {str(e)}", exc_info=True)
+        logger.error("[Callback] Error queueing post-install setup for store %s: %s", store_id, e, exc_info=True)
         # Don't fail the whole callback for webhook setup issues
 
-    # 8. Trigger Initial Data Sync (Async)
+    # Trigger Initial Data Sync (Async)
     try:
-        sync_store_data.delay(store.id)
-        store.sync_status = 'pending'
-        store.save(update_fields=['sync_status'])
-        logger.info(f"[Callback] Triggered background sync task for store ID: {store.id}")
+        sync_store_data.delay(store_id)
+        logger.info("[Callback] Triggered background sync task for store ID: %s", store_id)
     except Exception as e:
-        logger.error(f"[Callback] Error triggering background sync for store {store.id}: {str(e)}", exc_info=True)
+        logger.error("[Callback] Error triggering background sync for store %s: %s", store_id, e, exc_info=True)
 
-    # 9. Redirect to app in Shopify Admin
-    admin_url = f"https://{shop}/admin/apps/{settings.SHOPIFY_CLIENT_ID}"
-    logger.info(f"[Callback] Redirecting to app main page: {admin_url}")
-    return redirect(admin_url)
+# --- Helper Functions (Refactored & Added) ---
 
-# Add the missing AuthCallbackView class
-class AuthCallbackView(View):
+def get_store_cached(shop):
     """
-    Class-based view for handling the OAuth callback from Shopify.
-    This is a wrapper around the auth_callback function for use in urls.py.
+    Look up an active store by shop domain, cached for STORE_CACHE_TIMEOUT seconds.
+    
+    Only the fields the auth views need are cached, as a plain dict, so a warm
+    hit skips both the SQL query and model instantiation. Returns None when
+    the shop has no active store.
     """
-    @csrf_exempt
-    def dispatch(self, request, *args, **kwargs):
-        return super().dispatch(request, *args, **kwargs)
-        
-    def get(self, request):
-        """Handle GET requests for the OAuth callback"""
-        return auth_callback(request)
-        
-    def post(self, request):
-        """Handle POST requests for the OAuth callback (shouldn't happen but just in case)"""
-        return auth_callback(request)
-
-# --- Helper Functions (Refactored & Added) ---
-
-def hmac_is_valid(query_params):
-    """Verify the HMAC signature from Shopify using manual calculation."""
-    hmac_value = query_params.get('hmac')
+    return cache.get_or_set(
+        ShopifyStore.cache_key(shop),
+        lambda: ShopifyStore.objects.filter(shop_url=shop, is_active=True).values('id', 'access_token').first(),
+        STORE_CACHE_TIMEOUT,
+    )
+
+def hmac_is_valid(request):
+    """Verify the HMAC signature from Shopify over the raw query string."""
+    hmac_value = request.GET.get('hmac')
     if not hmac_value:
         logger.warning("[HMAC] No HMAC value found in query parameters.")
         return False # Or raise error, depending on strictness needed
 
-    # Create a dictionary of parameters excluding hmac
-    params_copy = query_params.copy()
-    params_copy.pop('hmac', None)
-    
-    # Sort the parameters and create the message string
-    sorted_params = sorted(params_copy.items())
-    message = '&'.join([f"{key}={value}" for key, value in sorted_params])
+    # A SHA-256 hex digest is 64 hex chars; reject anything else before hashing
+    if len(hmac_value) != 64:
+        logger.warning("[HMAC] Malformed HMAC value (length %s).", len(hmac_value))
+        return False
+    try:
+        bytes.fromhex(hmac_value)
+    except ValueError:
+        logger.warning("[HMAC] Malformed HMAC value (not hex).")
+        return False
+
+    # Sign the segments exactly as Shopify sent them (no decode/re-encode), minus hmac
+    query_string = request.META.get('QUERY_STRING', '').encode('utf-8')
+    message = b'&'.join(sorted(
+        segment for segment in query_string.split(b'&') if not segment.startswith(b'hmac=')
+    ))
     
     # Calculate the HMAC
     try:
-        digest = hmac.new(
-            settings.SHOPIFY_CLIENT_SECRET.encode('utf-8'),
-            message.encode('utf-8'),
-            hashlib.sha256
-        ).hexdigest()
+        mac = _HMAC_PROTO.copy()
+        mac.update(message)
+        digest = mac.hexdigest()
         
         is_valid = hmac.compare_digest(digest, hmac_value)
         if not is_valid:
-            logger.warning(f"[HMAC] Mismatch. Computed: {digest}, Received: {hmac_value}")
+            logger.warning("[HMAC] Mismatch. Computed: %s, Received: %s", digest, hmac_value)
         return is_valid
     except Exception as e:
-        logger.error(f"[HMAC] Error during HMAC calculation: {str(e)}", exc_info=True)
+        logger.error("[HMAC] Error during HMAC calculation: %s", e, exc_info=True)
         return False
 
 def exchange_code_for_token(shop, code):
     """Exchange authorization code for permanent access token"""
     access_token_url = f"https://{shop}/admin/oauth/access_token"
-    payload = {
-        "client_id": settings.SHOPIFY_CLIENT_ID,
-        "client_secret": settings.SHOPIFY_CLIENT_SECRET,
-        "code": code
-    }
+    payload = {**_TOKEN_CREDENTIALS, "code": code}
     try:
-        response = requests.post(access_token_url, json=payload, timeout=15)
+        response = _SHOPIFY_HTTP.post(access_token_url, json=payload, timeout=15)
         response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
         data = response.json()
         access_token = data.get('access_token')
         if not access_token:
-            logger.error(f"[Token Exchange] Access token not found in response: {data}")
+            logger.error("[Token Exchange] Access token not found in response: %s", data)
             return None
         return access_token
     except requests.exceptions.RequestException as e:
-        logger.error(f"[Token Exchange] Error: {str(e)}")
+        logger.error("[Token Exchange] Error: %s", e)
         if hasattr(e, 'response') and e.response is not None:
-            logger.error(f"[Token Exchange] Response Body: {e.response.text}")
+            logger.error("[Token Exchange] Response Body: %s", e.response.text)
         return None
 
 def get_shop_details(shop, access_token):
-    """Fetch shop details (name, email) using the Admin API."""
+    """Fetch shop details (name, email) using the Admin GraphQL API, cached briefly per shop."""
+    cache_key = f"shop_details:{shop}"
+    cached = cache.get(cache_key)
+    if cached:
+        return cached
+    
     client = ShopifyClient(shop, access_token)
     try:
-        # Use REST endpoint for simplicity here
-        response = client._request('GET', '/shop.json')
-        if response and 'shop' in response:
-            return response['shop']
+        response = client.graphql_raw(_SHOP_DETAILS_BODY, session=_SHOPIFY_HTTP)
+        data = response.get('data') if response else None
+        if data and data.get('shop'):
+            cache.set(cache_key, data['shop'], SHOP_DETAILS_CACHE_TIMEOUT)
+            return data['shop']
         else:
-            logger.warning(f"[Shop Details] Could not fetch shop details. Response: {response}")
+            logger.warning("[Shop Details] Could not fetch shop details. Response: %s", response)
             return None
     except Exception as e:
-        logger.error(f"[Shop Details] Error fetching details: {str(e)}")
+        logger.error("[Shop Details] Error fetching details: %s", e)
         return None
 
 def setup_webhooks(client, store):
-    """Set up essential webhooks (e.g., app/uninstalled)."""
-    required_webhooks = {
-        'app/uninstalled': f"{settings.APP_URL}/webhooks/app_uninstalled/",
-        # Add other essential webhooks here if needed
-        # 'products/update': f"{settings.APP_URL}/webhooks/products_update/",
-    }
-    
+    """Set up essential webhooks (see WEBHOOK_TOPICS)."""
     try:
+        # Skip the Shopify round trip when every required webhook is already recorded
+        # Uses the prefetched webhooks when the store came from .with_webhooks()
+        known_topics = {webhook.topic for webhook in store.webhooks.all()}
+        if known_topics.issuperset(WEBHOOK_TOPICS):
+            logger.info("[Webhooks] All required webhooks already recorded for store %s", store.id)
+            return
+        
         existing_webhooks = client.get_webhooks()
-        existing_topics = []
+        existing_by_topic = {}
         if existing_webhooks and 'webhooks' in existing_webhooks:
-            existing_topics = [wh['topic'] for wh in existing_webhooks['webhooks']]
+            existing_by_topic = {wh['topic']: wh for wh in existing_webhooks['webhooks']}
         
-        for topic, address in required_webhooks.items():
-            if topic not in existing_topics:
-                logger.info(f"[Webhooks] Creating webhook for topic: {topic}")
-                response = client.create_webhook(topic, address)
-                if response and 'webhook' in response:
-                    # Save webhook details (optional but good practice)
-                    ShopifyWebhook.objects.update_or_create(
+        webhook_rows = []
+        missing_webhooks = {}
+        for topic in WEBHOOK_TOPICS:
+            if topic in known_topics:
+                continue
+            if topic in existing_by_topic:
+                logger.info("[Webhooks] Webhook for topic %s already exists.", topic)
+                # Record it so the next setup can skip the remote lookup
+                webhook = existing_by_topic[topic]
+                webhook_rows.append(ShopifyWebhook(
+                    store=store,
+                    webhook_id=webhook['id'],
+                    topic=topic,
+                    address=webhook.get('address', WEBHOOK_ADDRESSES[topic])
+                ))
+            else:
+                logger.info("[Webhooks] Creating webhook for topic: %s", topic)
+                missing_webhooks[topic] = WEBHOOK_ADDRESSES[topic]
+        
+        if missing_webhooks:
+            # Register all missing webhooks in one GraphQL round trip
+            webhook_ids = client.create_webhooks_bulk(missing_webhooks)
+            for topic, address in missing_webhooks.items():
+                if topic in webhook_ids:
+                    webhook_rows.append(ShopifyWebhook(
                         store=store,
+                        webhook_id=webhook_ids[topic],
                         topic=topic,
-                        defaults={
-                            'webhook_id': response['webhook']['id'],
-                            'address': address
-                        }
-                    )
-                    logger.info(f"[Webhooks] Successfully created webhook for {topic}")
+                        address=address
+                    ))
+                    logger.info("[Webhooks] Successfully created webhook for %s", topic)
                 else:
-                    logger.error(f"[Webhooks] Failed to create webhook for {topic}. Response: {response}")
-            else:
-                logger.info(f"[Webhooks] Webhook for topic {topic} already exists.")
+                    logger.error("[Webhooks] Failed to create webhook for %s", topic)
+        
+        if webhook_rows:
+            with transaction.atomic():
+                # Upsert on (store, topic) so a re-created subscription replaces the stale ID
+                ShopifyWebhook.objects.bulk_create(
+                    webhook_rows,
+                    update_conflicts=True,
+                    unique_fields=['store', 'topic'],
+                    update_fields=['webhook_id', 'address'],
+                )
         
     except Exception as e:
-        logger.error(f"[Webhooks] Error during setup: {str(e)}", exc_info=True)
+        logger.error("[Webhooks] Error during setup: %s", e, exc_info=True)
         # Don't necessarily fail the whole callback for this
 
 class LogoutView(View):
@@ -311,16 +414,13 @@ def landing_page(request):
     shop = request.GET.get('shop')
     if not shop:
         # Show generic landing page if no shop parameter
-        return render(request, 'accounts/landing.html')
+        return _landing_page(request)
     
     # Check if this is a valid Shopify shop
     if not shop.endswith('.myshopify.com'):
         return HttpResponse("Invalid shop parameter", status=400)
     
     # Start OAuth process for Shopify
-    api_key = settings.SHOPIFY_CLIENT_ID
-    scopes = settings.SHOPIFY_API_SCOPES
-    redirect_uri = f"{settings.APP_URL}/auth/callback/"
     state = create_nonce()
     
     # Store the state in session for validation
@@ -328,106 +428,13 @@ def landing_page(request):
     request.session['shopify_shop'] = shop
     
     # Construct authorization URL
-    auth_url = f"https://{shop}/admin/oauth/authorize?client_id={api_key}&scope={scopes}&redirect_uri={redirect_uri}&state={state}"
+    auth_url = _AUTH_TMPL.format(shop=shop, state=state)
     
     return redirect(auth_url)
 
-@csrf_exempt
-def callback(request):
-    """
-    OAuth callback from Shopify - handles token exchange and triggers initial sync.
-    """
-    # Get parameters from request
-    shop = request.GET.get('shop')
-    code = request.GET.get('code')
-    state = request.GET.get('state')
-    
-    logger.info(f"Received callback for shop: {shop}, state: {state}")
-    
-    # Validate state to prevent CSRF
-    stored_state = request.session.get('shopify_auth_state')
-    stored_shop = request.session.get('shopify_shop')
-    
-    if not state or state != stored_state or not shop or shop != stored_shop:
-        logger.warning(f"Invalid state or shop mismatch during callback. State: {state} vs {stored_state}, Shop: {shop} vs {stored_shop}")
-        return HttpResponse("Invalid request: State mismatch.", status=400)
-    
-    logger.info("State validation successful.")
-    
-    # Exchange code for access token
-    access_token = exchange_code_for_token(shop, code)
-    if not access_token:
-        logger.error(f"Failed to exchange code for access token for shop: {shop}")
-        return HttpResponse("Failed to get access token", status=400)
-    
-    logger.info(f"Successfully obtained access token for shop: {shop}")
-    
-    # Get shop details
-    shop_details = get_shop_details(shop, access_token)
-    if not shop_details:
-        logger.error(f"Failed to get shop details for shop: {shop} after obtaining token.")
-        # Decide if this is fatal - maybe proceed without details?
-        # return HttpResponse("Failed to get shop details", status=400)
-        shop_name = shop # Fallback name
-    else:
-        shop_name = shop_details.get('name', shop)
-        logger.info(f"Successfully retrieved shop details for: {shop_name}")
-    
-    # --- Save or Update Store Information ---
-    try:
-        store, created = ShopifyStore.objects.update_or_create(
-            shop_url=shop,
-            defaults={
-                'access_token': access_token,
-                'shop_name': shop_name,
-                'email': shop_details.get('email') if shop_details else None,
-                'is_active': True, # Mark as active upon successful auth
-                'installed_at': timezone.now() if created else F('installed_at'), # Keep original install date
-                'scopes': settings.SHOPIFY_API_SCOPES # Store the requested scopes
-                # Add other fields from shop_details if needed
-            }
-        )
-        logger.info(f"{'Created' if created else 'Updated'} ShopifyStore record for {shop}")
-
-        # Store necessary info in session for app usage
-        request.session['shop'] = store.shop_url
-        request.session['store_id'] = store.id
-        request.session.pop('shopify_auth_state', None) # Clean up state
-        request.session.pop('shopify_shop', None)
-        request.session.pop('shopify_access_token', None) # Token is in DB now
-        
-        # --- Trigger Initial Data Sync --- 
-        # Use .delay() to run the task asynchronously
-        logger.info(f"Triggering initial data sync task for store ID: {store.id}")
-        sync_store_data.delay(store.id)
-        # Optionally update store status
-        store.sync_status = 'pending'
-        store.save(update_fields=['sync_status'])
-        # --- End Sync Trigger ---
-        
-        # --- User Association (Optional but Recommended) ---
-        # If you have a logged-in user concept separate from the store owner,
-        # associate the store with the user here.
-        # if request.user.is_authenticated:
-        #     store.user = request.user 
-        #     store.save()
-        # else:
-        #     # Maybe create a user based on shop details?
-        #     pass 
-        # --- End User Association ---
-
-    except Exception as e:
-        logger.error(f"Error saving store or triggering sync for {shop}: {str(e)}", exc_info=True)
-        return HttpResponse("Error processing store information.", status=500)
-    
-    # Redirect to app in Shopify Admin
-    app_url = f"https://{shop}/admin/apps/{settings.SHOPIFY_CLIENT_ID}"
-    logger.info(f"Redirecting to app main page: {app_url}")
-    return redirect(app_url)
-
 def create_nonce():
-    """Generate a random nonce for OAuth state"""
-    return base64.b64encode(os.urandom(16)).decode('utf-8')
+    """Generate a random URL-safe nonce for OAuth state"""
+    return secrets.token_urlsafe(16)
 
 @login_required
 def index(request):
@@ -435,46 +442,3 @@ def index(request):
     Dashboard view (requires login)
     """
     return redirect('dashboard:index')
-
-class LoginView(View):
-    """
-    View to start the Shopify OAuth flow.
-    """
-    def get(self, request):
-        # If shop isn't provided, show login form
-        shop = request.GET.get('shop')
-        if not shop:
-            return render(request, 'accounts/login.html')
-        
-        # Normalize shop URL
-        if not shop.endswith('.myshopify.com'):
-            shop = f"{shop}.myshopify.com"
-        
-        # Check if we already have a token for this shop
-        try:
-            store = ShopifyStore.objects.get(shop_url=shop, is_active=True)
-            if store.access_token:
-                # Store exists and has a token, update session
-                request.session['shop'] = shop
-                store.update_last_access()
-                return redirect('dashboard:index')
-        except ShopifyStore.DoesNotExist:
-            # Store doesn't exist, will create during callback
-            pass
-        
-        # Generate a state parameter to prevent CSRF
-        state = secrets.token_hex(16)
-        request.session['state'] = state
-        
-        # Build the redirect URL
-        redirect_uri = request.build_absolute_uri(reverse('accounts:callback'))
-        
-        # Generate the install URL
-        install_url = ShopifyClient.get_install_url(shop, redirect_uri, state)
-        
-        # Redirect to Shopify for authorization
-        return HttpResponseRedirect(install_url)
-
-"""
-Closing any potentially unclosed docstring
-""" 
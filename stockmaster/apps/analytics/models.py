@@ -1,7 +1,8 @@
 from django.db import models
+from django.db.models.functions import Now
 from django.utils import timezone
 from apps.accounts.models import ShopifyStore
-from apps.inventory.models import Product
+from apps.inventory.models import Product, InventoryLevel
 
 
 class DailySummary(models.Model):
@@ -33,6 +34,27 @@ class DailySummary(models.Model):
     def __str__(self):
         return f"Summary for {self.store.shop_url} on {self.date}"
 
+    @classmethod
+    def refresh_for_store(cls, store, date=None):
+        """Recompute the product counts for a store and upsert the row for `date` (default today)."""
+        # EXISTS stops at the first empty level per product, so no join or DISTINCT is needed
+        out_of_stock = InventoryLevel.objects.filter(variant__product_id=models.OuterRef('pk'), available__lte=0)
+        counts = Product.objects.filter(store=store).aggregate(
+            total=models.Count('id'),
+            out_of_stock=models.Count('id', filter=models.Q(models.Exists(out_of_stock))),
+            hidden=models.Count('id', filter=models.Q(is_visible=False)),
+        )
+        summary, _ = cls.objects.update_or_create(
+            store=store,
+            date=date or timezone.now().date(),
+            defaults={
+                'total_products': counts['total'],
+                'out_of_stock_products': counts['out_of_stock'],
+                'hidden_products': counts['hidden'],
+            }
+        )
+        return summary
+
 
 class ProductAnalytics(models.Model):
     """Model to track product analytics and history."""
@@ -67,6 +89,21 @@ class ProductAnalytics(models.Model):
         return f"Analytics for {self.product.title}"
 
 
+class StockPredictionQuerySet(models.QuerySet):
+    """QuerySet helpers for StockPrediction."""
+    
+    def with_days_left(self):
+        """Annotate `days_left` (a timedelta, computed by the database) for list views."""
+        return self.annotate(days_left=models.ExpressionWrapper(
+            models.F('predicted_out_of_stock_date') - Now(),
+            output_field=models.DurationField(),
+        ))
+
+
+class StockPredictionManager(models.Manager.from_queryset(StockPredictionQuerySet)):
+    """Manager for StockPrediction; use .with_days_left() when rendering many rows."""
+
+
 class StockPrediction(models.Model):
     """Model to store stock level predictions for products."""
     
@@ -82,6 +119,8 @@ class StockPrediction(models.Model):
     
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = StockPredictionManager()
+    
     class Meta:
         verbose_name = "Stock Prediction"
         verbose_name_plural = "Stock Predictions"
@@ -102,5 +141,6 @@ class StockPrediction(models.Model):
         if not self.predicted_out_of_stock_date:
             return None
         
-        delta = self.predicted_out_of_stock_date - timezone.now()
+        # Rows from with_days_left() already carry the difference
+        delta = getattr(self, 'days_left', None) or self.predicted_out_of_stock_date - timezone.now()
         return max(0, delta.days) 
\ No newline at end of file
@@ -1,16 +1,39 @@
+from datetime import timedelta
+
 from django.views import View
 from django.shortcuts import render
 from django.contrib import messages
 from django.utils import timezone
-from django.db.models import Count, Sum, Q
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.middleware.http import ConditionalGetMiddleware
+from django.utils.decorators import decorator_from_middleware, method_decorator
+from django.views.decorators.cache import cache_control, cache_page
+from django.views.decorators.vary import vary_on_cookie
 
 from apps.accounts.models import ShopifyStore
-from apps.inventory.models import Product, InventoryLevel, InventoryLog
-from apps.rules.models import Rule, RuleApplication
+from apps.inventory.models import InventoryLog
+from apps.rules.models import Rule
 from apps.notifications.models import Notification
 from apps.analytics.models import DailySummary
 
+# Seconds the dashboard may reuse a cached store record; saves invalidate it sooner
+DASHBOARD_STORE_CACHE_TIMEOUT = 60
+
+# Seconds a rendered dashboard is reused for the same session cookie
+DASHBOARD_PAGE_CACHE_TIMEOUT = 30
+
+# Sync states after which the template shows the stats cards and graph
+SYNCED_STATUSES = ('success', 'failed')
 
+
+# Cached per session (the shop comes from it); the content ETag lets browsers revalidate with a 304
+@method_decorator([
+    decorator_from_middleware(ConditionalGetMiddleware),
+    cache_control(private=True),
+    cache_page(DASHBOARD_PAGE_CACHE_TIMEOUT, key_prefix='dashboard'),
+    vary_on_cookie,
+], name='get')
 class DashboardView(View):
     """Main dashboard view showing summary of inventory and app status."""
     
@@ -23,43 +46,23 @@ class DashboardView(View):
             return render(request, 'dashboard/error.html', {'error': 'No shop selected', 'base_template': 'base.html'})
             
         try:
-            store = ShopifyStore.objects.get(shop_url=shop, is_active=True)
+            cache_key = ShopifyStore.dashboard_cache_key(shop)
+            store = cache.get(cache_key)
+            if store is None:
+                store = ShopifyStore.objects.get(shop_url=shop, is_active=True)
+                cache.set(cache_key, store, DASHBOARD_STORE_CACHE_TIMEOUT)
             
             # Update last access timestamp
             store.update_last_access()
             
-            # Get inventory summary
-            total_products = Product.objects.filter(store=store).count()
-            
-            out_of_stock_products = Product.objects.filter(
-                store=store,
-                variants__inventory_levels__available__lte=0
-            ).distinct().count()
-            
-            hidden_products = Product.objects.filter(
-                store=store,
-                is_visible=False
-            ).count()
+            # One clock read for the whole request
+            now = timezone.now()
             
-            # Get rule summary
-            active_rules = Rule.objects.filter(
-                store=store,
-                is_active=True
-            ).count()
-            
-            rule_applications_pending = RuleApplication.objects.filter(
-                rule__store=store,
-                status='pending'
-            ).count()
-            
-            rule_applications_last_24h = RuleApplication.objects.filter(
-                rule__store=store,
-                applied_at__gte=timezone.now() - timezone.timedelta(days=1)
-            ).count()
-            
-            # Get recent inventory logs
+            # Get recent inventory logs (the table shows action, product title and time)
             recent_logs = InventoryLog.objects.filter(
                 store=store
+            ).select_related('product').only(
+                'action', 'created_at', 'product__title'
             ).order_by('-created_at')[:10]
             
             # Get recent notifications
@@ -71,58 +74,21 @@ class DashboardView(View):
             is_trial = store.is_trial
             trial_days_left = store.trial_days_left if is_trial else 0
             
-            # Inventory graph data (last 14 days)
-            start_date = timezone.now().date() - timezone.timedelta(days=13)
-            
-            daily_summaries = DailySummary.objects.filter(
-                store=store,
-                date__gte=start_date
-            ).order_by('date')
-            
-            graph_labels = []
-            out_of_stock_data = []
-            hidden_products_data = []
-            
-            current_date = start_date
-            end_date = timezone.now().date()
-            
-            # Create a dictionary for quick lookup
-            summary_dict = {summary.date: summary for summary in daily_summaries}
-            
-            while current_date <= end_date:
-                graph_labels.append(current_date.strftime('%b %d'))
-                
-                if current_date in summary_dict:
-                    summary = summary_dict[current_date]
-                    out_of_stock_data.append(summary.out_of_stock_products)
-                    hidden_products_data.append(summary.hidden_products)
-                else:
-                    # No data for this date
-                    out_of_stock_data.append(0)
-                    hidden_products_data.append(0)
-                
-                current_date += timezone.timedelta(days=1)
-            
             context = {
                 'store': store,
                 'sync_status': store.sync_status,
                 'last_sync_at': store.last_sync_at,
-                'total_products': total_products,
-                'out_of_stock_products': out_of_stock_products,
-                'hidden_products': hidden_products,
-                'active_rules': active_rules,
-                'rule_applications_pending': rule_applications_pending,
-                'rule_applications_last_24h': rule_applications_last_24h,
                 'recent_logs': recent_logs,
                 'recent_notifications': recent_notifications,
                 'is_trial': is_trial,
                 'trial_days_left': trial_days_left,
-                'graph_labels': graph_labels,
-                'out_of_stock_data': out_of_stock_data,
-                'hidden_products_data': hidden_products_data,
                 'base_template': 'base.html'
             }
             
+            # The stats cards and graph only render once a sync has finished; skip their queries until then
+            if store.sync_status in SYNCED_STATUSES:
+                context.update(self.get_summary_context(store, now))
+            
             return render(request, 'dashboard/index.html', context)
             
         except ShopifyStore.DoesNotExist:
@@ -131,4 +97,53 @@ class DashboardView(View):
             return render(request, 'dashboard/error.html', {
                 'error': f"Store {shop} not found", 
                 'base_template': 'base.html'
-            }) 
\ No newline at end of file
+            })
+    
+    def get_summary_context(self, store, now):
+        """Inventory and rule counts plus the 14-day graph series for a synced store."""
+        today = now.date()
+        start_date = today - timedelta(days=13)
+        
+        # Daily roll-ups for the last 14 days; only the counted columns are read
+        daily_summaries = DailySummary.objects.filter(
+            store=store,
+            date__gte=start_date
+        ).values('date', 'total_products', 'out_of_stock_products', 'hidden_products')
+        
+        # Create a dictionary for quick lookup
+        summary_dict = {summary['date']: summary for summary in daily_summaries}
+        
+        # Get inventory summary from today's roll-up (refreshed by the sync task)
+        today_summary = summary_dict.get(today)
+        if today_summary is None:
+            refreshed = DailySummary.refresh_for_store(store, today)
+            today_summary = summary_dict[today] = {
+                'total_products': refreshed.total_products,
+                'out_of_stock_products': refreshed.out_of_stock_products,
+                'hidden_products': refreshed.hidden_products,
+            }
+        
+        # Get rule summary (one query over rules and their applications)
+        rule_counts = Rule.objects.filter(store=store).aggregate(
+            active=Count('id', filter=Q(is_active=True), distinct=True),
+            pending=Count('applications', filter=Q(applications__status__in=('pending', 'queued'))),
+            last_24h=Count(
+                'applications',
+                filter=Q(applications__applied_at__gte=now - timedelta(days=1))
+            ),
+        )
+        
+        # One entry per day, zero-filled where no summary was recorded
+        dates = [start_date + timedelta(days=i) for i in range(14)]
+        
+        return {
+            'total_products': today_summary['total_products'],
+            'out_of_stock_products': today_summary['out_of_stock_products'],
+            'hidden_products': today_summary['hidden_products'],
+            'active_rules': rule_counts['active'],
+            'rule_applications_pending': rule_counts['pending'],
+            'rule_applications_last_24h': rule_counts['last_24h'],
+            'graph_labels': [d.strftime('%b %d') for d in dates],
+            'out_of_stock_data': [summary_dict[d]['out_of_stock_products'] if d in summary_dict else 0 for d in dates],
+            'hidden_products_data': [summary_dict[d]['hidden_products'] if d in summary_dict else 0 for d in dates],
+        } 
\ No newline at end of file
@@ -1,10 +1,21 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from django.core.management.base import BaseCommand
+from django.db import connection
 from apps.accounts.models import ShopifyStore
 from apps.inventory.tasks import sync_store_data
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+def _sync_store(store_id):
+    """Run one store's sync on a worker thread, releasing its DB connection afterwards."""
+    try:
+        return sync_store_data(store_id)
+    finally:
+        connection.close()
+
+
 class Command(BaseCommand):
     help = 'Sync data from Shopify stores'
 
@@ -14,6 +25,12 @@ class Command(BaseCommand):
             type=str,
             help='Store URL (e.g., mystore.myshopify.com)',
         )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Number of stores to sync concurrently (default: 8)',
+        )
 
     def handle(self, *args, **options):
         store_url = options.get('store')
@@ -33,21 +50,25 @@ class Command(BaseCommand):
                 self.stdout.write(self.style.ERROR(f"Store not found: {store_url}"))
         else:
             # Sync all active stores
-            stores = ShopifyStore.objects.filter(is_active=True)
-            self.stdout.write(f"Found {stores.count()} active stores")
-            
-            # Print the list of stores
-            for store in stores:
-                self.stdout.write(f"- {store.shop_url} (ID: {store.id})")
+            # Stream the rows instead of loading every store; each is listed and queued as it arrives
+            stores = ShopifyStore.objects.filter(is_active=True).values_list('id', 'shop_url').iterator(chunk_size=2000)
             
-            if stores.exists():
-                self.stdout.write("Starting sync for all stores...")
-                for store in stores:
+            # Each sync is bound on Shopify API calls, so run several stores at once
+            with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as executor:
+                futures = {}
+                for store_id, shop_url in stores:
+                    self.stdout.write(f"- {shop_url} (ID: {store_id})")
+                    futures[executor.submit(_sync_store, store_id)] = shop_url
+                
+                if not futures:
+                    self.stdout.write(self.style.WARNING("No active stores found"))
+                    return
+                
+                self.stdout.write(f"Found {len(futures)} active stores, syncing...")
+                for future in as_completed(futures):
+                    shop_url = futures[future]
                     try:
-                        self.stdout.write(f"Syncing {store.shop_url}...")
-                        sync_store_data(store.id)
-                        self.stdout.write(self.style.SUCCESS(f"Successfully synced data for {store.shop_url}"))
+                        future.result()
+                        self.stdout.write(self.style.SUCCESS(f"Successfully synced data for {shop_url}"))
                     except Exception as e:
-                        self.stdout.write(self.style.ERROR(f"Error syncing {store.shop_url}: {str(e)}"))
-            else:
-                self.stdout.write(self.style.WARNING("No active stores found")) 
\ No newline at end of file
+                        self.stdout.write(self.style.ERROR(f"Error syncing {shop_url}: {str(e)}"))
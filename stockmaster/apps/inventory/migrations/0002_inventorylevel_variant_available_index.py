@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-16 13:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='inventorylevel',
+            name='inventory_i_availab_ec40c9_idx',
+        ),
+        migrations.AddIndex(
+            model_name='inventorylevel',
+            index=models.Index(fields=['variant', 'available'], name='invlevel_variant_avail_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-16 13:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_inventorylevel_variant_available_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='inventory_p_store_i_89f19c_idx',
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('is_visible', False)), fields=['store'], name='product_hidden_idx'),
+        ),
+    ]
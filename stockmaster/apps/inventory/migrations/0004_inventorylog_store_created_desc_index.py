@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-16 13:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_product_hidden_partial_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='inventorylog',
+            name='inventory_i_store_i_fbb51c_idx',
+        ),
+        migrations.AddIndex(
+            model_name='inventorylog',
+            index=models.Index(fields=['store', '-created_at'], name='invlog_store_created_desc'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-16 13:20
+
+from django.db import migrations
+
+
+def create_brin_index(apps, schema_editor):
+    """BRIN is PostgreSQL-only; other backends keep just the btree indexes."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS invlog_created_brin ON inventory_inventorylog "
+        "USING brin (created_at) WITH (pages_per_range = 32);"
+    )
+
+
+def drop_brin_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS invlog_created_brin;")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_inventorylog_store_created_desc_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_brin_index, drop_brin_index),
+    ]
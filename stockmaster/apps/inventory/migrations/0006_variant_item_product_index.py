@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-16 13:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_inventorylog_created_brin'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='productvariant',
+            name='inventory_p_invento_8f777f_idx',
+        ),
+        migrations.AddIndex(
+            model_name='productvariant',
+            index=models.Index(fields=['inventory_item_id', 'product'], name='variant_item_product_idx'),
+        ),
+    ]
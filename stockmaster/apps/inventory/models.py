@@ -3,6 +3,28 @@ from django.utils import timezone
 from apps.accounts.models import ShopifyStore
 
 
+class ProductQuerySet(models.QuerySet):
+    """QuerySet helpers for Product."""
+    
+    def with_analytics(self):
+        """Join each product's ProductAnalytics row so list views don't fetch it per product."""
+        return self.select_related('analytics')
+    
+    def with_latest_prediction(self):
+        """Prefetch each product's newest StockPrediction into a one-item `latest_prediction` list."""
+        # Resolved through the relation; importing analytics here would be circular
+        StockPrediction = self.model._meta.get_field('stock_predictions').related_model
+        return self.prefetch_related(models.Prefetch(
+            'stock_predictions',
+            queryset=StockPrediction.objects.order_by('-created_at')[:1],
+            to_attr='latest_prediction',
+        ))
+
+
+class ProductManager(models.Manager.from_queryset(ProductQuerySet)):
+    """Manager for Product; use .with_analytics() / .with_latest_prediction() in reporting lists."""
+
+
 class Product(models.Model):
     """Model to store Shopify product information."""
     
@@ -23,6 +45,8 @@ class Product(models.Model):
     hidden_at = models.DateTimeField(blank=True, null=True, help_text="When the product was hidden")
     scheduled_return = models.DateTimeField(blank=True, null=True, help_text="When the product is scheduled to be visible again")
     
+    objects = ProductManager()
+    
     class Meta:
         verbose_name = "Product"
         verbose_name_plural = "Products"
@@ -30,7 +54,8 @@ class Product(models.Model):
         indexes = [
             models.Index(fields=['store', 'shopify_id']),
             models.Index(fields=['store', 'handle']),
-            models.Index(fields=['store', 'is_visible']),
+            # Most products are visible; index only the hidden minority
+            models.Index(fields=['store'], name='product_hidden_idx', condition=models.Q(is_visible=False)),
         ]
     
     def __str__(self):
@@ -70,7 +95,8 @@ class ProductVariant(models.Model):
         unique_together = ('product', 'shopify_id')
         indexes = [
             models.Index(fields=['shopify_id']),
-            models.Index(fields=['inventory_item_id']),
+            # Webhooks look variants up by inventory item and only need the product from the row
+            models.Index(fields=['inventory_item_id', 'product'], name='variant_item_product_idx'),
         ]
     
     def __str__(self):
@@ -111,7 +137,8 @@ class InventoryLevel(models.Model):
         unique_together = ('variant', 'location')
         indexes = [
             models.Index(fields=['variant', 'location']),
-            models.Index(fields=['available']),
+            # Serves the per-variant out-of-stock EXISTS probe; `available` alone is too unselective
+            models.Index(fields=['variant', 'available'], name='invlevel_variant_avail_idx'),
         ]
     
     def __str__(self):
@@ -148,8 +175,10 @@ class InventoryLog(models.Model):
         verbose_name = "Inventory Log"
         verbose_name_plural = "Inventory Logs"
         indexes = [
-            models.Index(fields=['store', 'created_at']),
+            # Matches the newest-first per-store listing, so no sort step is needed
+            models.Index(fields=['store', '-created_at'], name='invlog_store_created_desc'),
             models.Index(fields=['product', 'created_at']),
+            # On PostgreSQL, migration 0005 adds a BRIN index on created_at for time-range scans
         ]
         ordering = ['-created_at']
     
@@ -1,11 +1,15 @@
 # Import all tasks to make them available from the tasks package
 from .sync_tasks import (
     sync_store_data,
-    sync_product
+    finish_store_sync,
+    sync_product,
+    sync_product_data
 )
 
 from .inventory_tasks import (
     process_inventory_update,
+    process_variant_updates,
+    queue_variant_update,
 )
 
 from .rule_tasks import (
@@ -16,28 +20,9 @@ from .rule_tasks import (
 
 # Import utility functions
 from .utils import (
+    get_location_map,
     get_variant_by_id,
+    get_variant_products,
     parse_shopify_datetime,
     rule_matches_product
-) 
-from .sync_tasks import (
-    sync_store_data,
-    sync_product
-)
-
-from .inventory_tasks import (
-    process_inventory_update,
-)
-
-from .rule_tasks import (
-    apply_rule,
-    check_scheduled_rules,
-    restore_product
 )
-
-# Import utility functions
-from .utils import (
-    get_variant_by_id,
-    parse_shopify_datetime,
-    rule_matches_product
-) 
\ No newline at end of file
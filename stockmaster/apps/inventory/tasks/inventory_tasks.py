@@ -1,71 +1,202 @@
 from celery import shared_task
+from django.core.cache import cache
 from django.utils import timezone
+from django_redis import get_redis_connection
 import logging
+import uuid
 
-from core.shopify.client import ShopifyClient
-from .utils import get_variant_by_id
+from core.shopify.client import MAX_RETRIES, ShopifyClient, retry_delay
+from .utils import get_variant_by_id, get_variant_products, parse_shopify_datetime
 
 logger = logging.getLogger(__name__)
 
+# Seconds variant webhooks are buffered before they are resolved in one lookup
+VARIANT_BATCH_WINDOW = 1
+
+# Most variant IDs resolved by one process_variant_updates run
+VARIANT_BATCH_SIZE = 100
+
+# Shopify calls in one product sync (the product, then its inventory levels), the seconds
+# ShopifyClient may back off on each, and an allowance per request attempt
+PRODUCT_SYNC_CALLS = 2
+SHOPIFY_CALL_BACKOFF = sum(retry_delay(attempt) for attempt in range(MAX_RETRIES - 1))
+SHOPIFY_REQUEST_SECONDS = 5
+
+# Upper bound in seconds on how long one webhook-triggered product sync holds its lock;
+# also how long its dirty flag lives, so the flag outlasts the sync that has to see it
+PRODUCT_SYNC_LOCK_TIMEOUT = PRODUCT_SYNC_CALLS * (SHOPIFY_CALL_BACKOFF + MAX_RETRIES * SHOPIFY_REQUEST_SECONDS)
+
+# Seconds before buffered variants are looked up again after a failed lookup,
+# and how old a webhook may get before its variant is dropped instead
+VARIANT_RETRY_DELAY = 10
+VARIANT_RETRY_MAX_AGE = 60 * 60
+
+# Store columns a webhook-triggered sync reads; the rest of the row is never used
+STORE_SYNC_FIELDS = ('id', 'shop_url', 'access_token')
+
+
+def _pending_variants_key(shop_domain):
+    return f"inventory:pending_variants:{shop_domain}"
+
+
+def _merge_event_time(event_times, key, event_time):
+    """Keep the latest webhook time per key; a missing time (None) wins, so the key is never skipped as stale."""
+    if key not in event_times:
+        event_times[key] = event_time
+    elif event_times[key] is None or event_time is None:
+        event_times[key] = None
+    else:
+        event_times[key] = max(event_times[key], event_time)
+
+
+def _sync_product_locked(client, store, product_id):
+    """
+    Sync one product, collapsing concurrent webhook-triggered syncs into one.
+    
+    While a sync holds the product's lock, later callers only flag the product
+    dirty; the holder syncs again once it finishes, so a change that landed
+    after its fetch is not lost.
+    """
+    from .sync_tasks import sync_product_data
+    
+    lock_key = f"lock:sync:{store.shop_url}:{product_id}"
+    dirty_key = f"{lock_key}:dirty"
+    result = {'status': 'skipped', 'reason': f"Product {product_id} sync already running"}
+    while True:
+        # The token keeps a sync that overran its lock from releasing the next holder's
+        token = uuid.uuid4().hex
+        if not cache.add(lock_key, token, timeout=PRODUCT_SYNC_LOCK_TIMEOUT):
+            cache.set(dirty_key, 1, timeout=PRODUCT_SYNC_LOCK_TIMEOUT)
+            logger.info(f"Product {product_id} is already being synced for {store.shop_url}, flagged for a resync")
+            return result
+        try:
+            # Changes flagged before this fetch are picked up by it
+            cache.delete(dirty_key)
+            result = sync_product_data(client, store, product_id)
+        finally:
+            if cache.get(lock_key) == token:
+                cache.delete(lock_key)
+        
+        if not cache.delete(dirty_key):
+            return result
+        logger.info(f"Product {product_id} changed during its sync for {store.shop_url}, syncing again")
+
+
+def _sync_product_if_current(client, store, product_id, event_time=None):
+    """
+    Sync one product for a webhook, unless a sync started after the webhook fired.
+    
+    Args:
+        event_time (datetime, optional): When Shopify fired the webhook
+    """
+    from apps.inventory.models import Product
+    
+    # A sync that started after the webhook fired has already picked up this change
+    if event_time and Product.objects.filter(
+        store=store, shopify_id=product_id, last_synced__gt=event_time
+    ).exists():
+        logger.info(f"Product {product_id} was synced after the webhook fired, skipping")
+        return {'status': 'stale', 'reason': f"Product {product_id} synced after {event_time.isoformat()}"}
+    
+    return _sync_product_locked(client, store, product_id)
+
+
+def queue_variant_update(shop_domain, variant_id, event_at=None):
+    """
+    Buffer a variant from an inventory webhook instead of resolving it right away.
+    
+    The first variant buffered for a shop schedules process_variant_updates,
+    which resolves everything buffered during the window with one GraphQL query.
+    
+    Args:
+        shop_domain (str): The Shopify store domain
+        variant_id (int): The Shopify variant ID
+        event_at (str, optional): When Shopify triggered the webhook (X-Shopify-Triggered-At)
+    """
+    redis = get_redis_connection('default')
+    key = _pending_variants_key(shop_domain)
+    redis.rpush(key, f"{variant_id}|{event_at or ''}")
+    if redis.set(f"{key}:scheduled", 1, nx=True, ex=VARIANT_BATCH_WINDOW * 60):
+        process_variant_updates.apply_async(args=[shop_domain], countdown=VARIANT_BATCH_WINDOW)
+
+
 @shared_task
-def process_inventory_update(shop_domain, product_id=None, variant_id=None):
+def process_variant_updates(shop_domain):
     """
-    Process inventory update when a webhook is received.
+    Sync the products of the variants buffered by queue_variant_update.
     
     Args:
         shop_domain (str): The Shopify store domain
-        product_id (int, optional): The Shopify product ID
-        variant_id (int, optional): The Shopify variant ID
         
     Returns:
         dict: Summary of operations performed
     """
     from apps.accounts.models import ShopifyStore
     
-    logger.info(f"Processing inventory update for {shop_domain}, product: {product_id}, variant: {variant_id}")
+    redis = get_redis_connection('default')
+    key = _pending_variants_key(shop_domain)
+    
+    # Clear the flag first so variants buffered from now on schedule the next run
+    redis.delete(f"{key}:scheduled")
+    pipe = redis.pipeline()
+    pipe.lrange(key, 0, VARIANT_BATCH_SIZE - 1)
+    pipe.ltrim(key, VARIANT_BATCH_SIZE, -1)
+    entries, _ = pipe.execute()
+    if redis.llen(key) and redis.set(f"{key}:scheduled", 1, nx=True, ex=VARIANT_BATCH_WINDOW * 60):
+        process_variant_updates.apply_async(args=[shop_domain])
+    
+    if not entries:
+        return {'status': 'success', 'products': 0}
+    
+    # Latest webhook time per variant; None when any of its webhooks had none
+    event_times = {}
+    for entry in entries:
+        variant_id, _, event_at = entry.decode().partition('|')
+        _merge_event_time(event_times, int(variant_id), parse_shopify_datetime(event_at))
+    variant_ids = list(event_times)
     
     try:
-        # Get the store
-        store = ShopifyStore.objects.get(shop_url=shop_domain, is_active=True)
-        
-        # Setup client
-        client = ShopifyClient(store)
-        
-        # If variant ID is provided but product ID is not, look up the product ID
-        if variant_id and not product_id:
-            variant_info = get_variant_by_id(client, variant_id)
-            if variant_info and 'product_id' in variant_info:
-                product_id = variant_info['product_id']
-                logger.info(f"Found product ID {product_id} for variant {variant_id}")
-            else:
-                logger.warning(f"Could not find product for variant {variant_id}")
-                return {'error': f"Could not find product for variant {variant_id}"}
-        
-        # Process product update
-        if product_id:
-            from .sync_tasks import sync_product
-            result = sync_product(client, store, product_id)
-            return result
-        else:
-            logger.error(f"No product ID provided and could not be determined")
-            return {'error': "No product ID provided and could not be determined"}
-            
+        store = ShopifyStore.objects.only(*STORE_SYNC_FIELDS).get(shop_url=shop_domain, is_active=True)
     except ShopifyStore.DoesNotExist:
         logger.error(f"Store {shop_domain} not found or not active")
         return {'error': f"Store {shop_domain} not found or not active"}
+    
+    client = ShopifyClient(store.shop_url, store.access_token)
+    try:
+        variant_products = get_variant_products(client, variant_ids)
     except Exception as e:
-        logger.exception(f"Error processing inventory update: {str(e)}")
-        return {'error': str(e)} 
-from django.utils import timezone
-import logging
-
-from core.shopify.client import ShopifyClient
-from .utils import get_variant_by_id
-
-logger = logging.getLogger(__name__)
+        # Put the batch back so a later run resolves it instead of losing the updates.
+        # Variants without a webhook time are stamped now, so every entry ages out eventually
+        now = timezone.now()
+        cutoff = now - timezone.timedelta(seconds=VARIANT_RETRY_MAX_AGE)
+        retry = [
+            f"{variant_id}|{(event_time or now).isoformat()}"
+            for variant_id, event_time in event_times.items()
+            if not event_time or event_time > cutoff
+        ]
+        logger.warning(f"Could not resolve variants for {shop_domain}, retrying {len(retry)} of them: {str(e)}")
+        if retry:
+            redis.rpush(key, *retry)
+            if redis.set(f"{key}:scheduled", 1, nx=True, ex=VARIANT_BATCH_WINDOW * 60):
+                process_variant_updates.apply_async(args=[shop_domain], countdown=VARIANT_RETRY_DELAY)
+        return {'error': f"Could not resolve variants for {shop_domain}"}
+    
+    # A product is only stale if it was synced after every one of its variants' webhooks
+    product_events = {}
+    for variant_id, product_id in variant_products.items():
+        _merge_event_time(product_events, product_id, event_times[variant_id])
+    logger.info(f"Resolved {len(variant_ids)} variants to {len(product_events)} products for {shop_domain}")
+    
+    for product_id, event_time in product_events.items():
+        try:
+            _sync_product_if_current(client, store, product_id, event_time)
+        except Exception as e:
+            logger.exception(f"Error syncing product {product_id}: {str(e)}")
+    
+    return {'status': 'success', 'variants': len(variant_ids), 'products': len(product_events)}
 
 @shared_task
-def process_inventory_update(shop_domain, product_id=None, variant_id=None):
+def process_inventory_update(shop_domain, product_id=None, variant_id=None, event_at=None):
     """
     Process inventory update when a webhook is received.
     
@@ -73,6 +204,7 @@ def process_inventory_update(shop_domain, product_id=None, variant_id=None):
         shop_domain (str): The Shopify store domain
         product_id (int, optional): The Shopify product ID
         variant_id (int, optional): The Shopify variant ID
+        event_at (str, optional): When Shopify triggered the webhook (X-Shopify-Triggered-At)
         
     Returns:
         dict: Summary of operations performed
@@ -83,10 +215,10 @@ def process_inventory_update(shop_domain, product_id=None, variant_id=None):
     
     try:
         # Get the store
-        store = ShopifyStore.objects.get(shop_url=shop_domain, is_active=True)
+        store = ShopifyStore.objects.only(*STORE_SYNC_FIELDS).get(shop_url=shop_domain, is_active=True)
         
         # Setup client
-        client = ShopifyClient(store)
+        client = ShopifyClient(store.shop_url, store.access_token)
         
         # If variant ID is provided but product ID is not, look up the product ID
         if variant_id and not product_id:
@@ -100,9 +232,7 @@ def process_inventory_update(shop_domain, product_id=None, variant_id=None):
         
         # Process product update
         if product_id:
-            from .sync_tasks import sync_product
-            result = sync_product(client, store, product_id)
-            return result
+            return _sync_product_if_current(client, store, product_id, parse_shopify_datetime(event_at))
         else:
             logger.error(f"No product ID provided and could not be determined")
             return {'error': "No product ID provided and could not be determined"}
@@ -112,4 +242,4 @@ def process_inventory_update(shop_domain, product_id=None, variant_id=None):
         return {'error': f"Store {shop_domain} not found or not active"}
     except Exception as e:
         logger.exception(f"Error processing inventory update: {str(e)}")
-        return {'error': str(e)} 
\ No newline at end of file
+        return {'error': str(e)}
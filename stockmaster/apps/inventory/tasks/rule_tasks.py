@@ -1,68 +1,88 @@
 from celery import shared_task
 from django.utils import timezone
 from django.db import transaction
+from django.db.models import Q
 import logging
 
-from .utils import rule_matches_product
-
 logger = logging.getLogger(__name__)
 
+# Rule applications sent to the broker per message by check_scheduled_rules
+RULE_APPLY_CHUNK_SIZE = 100
+
+# Most due applications one check_scheduled_rules transaction claims
+RULE_CLAIM_BATCH_SIZE = 500
+
+# Minutes past scheduled_for after which a still-queued application is assumed lost and claimed again
+RULE_QUEUED_TIMEOUT_MINUTES = 15
+
 def process_out_of_stock_rules(store, product):
     """
     Process rules for an out-of-stock product.
     """
-    from apps.rules.models import Rule
+    from apps.rules.models import Rule, RuleApplication
     
     logger.info(f"Processing out-of-stock rules for product {product.id} in store {store.id}")
     
-    # Get all active rules for this store
+    # Match the product type and vendor filters in the query; an empty filter matches any product
     rules = Rule.objects.filter(
         store=store,
         is_active=True,
         trigger_type='out_of_stock'
-    ).order_by('priority')
-    
-    for rule in rules:
-        if rule_matches_product(rule, product):
-            logger.info(f"Rule {rule.id} matches product {product.id}")
-            schedule_rule_application(rule, product)
-
-
-def schedule_rule_application(rule, product):
-    """
-    Schedule a rule application.
-    """
-    from apps.rules.models import RuleApplication
-    
-    # Check if there's already a pending application for this rule and product
-    existing = RuleApplication.objects.filter(
-        rule=rule,
-        product=product,
-        status='pending'
-    ).exists()
-    
-    if existing:
-        logger.info(f"Rule {rule.id} already scheduled for product {product.id}")
+    ).filter(
+        Q(product_type_filter__isnull=True) | Q(product_type_filter='') | Q(product_type_filter=product.product_type),
+        Q(vendor_filter__isnull=True) | Q(vendor_filter='') | Q(vendor_filter=product.vendor),
+    ).only('delay_minutes').order_by('-priority')
+    rules = list(rules)
+    if not rules:
         return
     
-    # Calculate when to apply the rule based on delay
-    apply_at = timezone.now()
-    if rule.delay_minutes > 0:
-        apply_at = apply_at + timezone.timedelta(minutes=rule.delay_minutes)
-    
-    # Create the rule application
-    application = RuleApplication.objects.create(
-        rule=rule,
+    # One query for the rules already waiting on this product, instead of one per rule
+    pending_rule_ids = set(RuleApplication.objects.filter(
         product=product,
-        status='pending',
-        scheduled_at=apply_at
-    )
+        rule__in=rules,
+        status__in=('pending', 'queued')
+    ).values_list('rule_id', flat=True))
     
-    logger.info(f"Scheduled rule {rule.id} for product {product.id} at {apply_at}")
+    # Build every new application and insert them together
+    now = timezone.now()
+    new_applications = []
+    for rule in rules:
+        if rule.id in pending_rule_ids:
+            logger.info(f"Rule {rule.id} already scheduled for product {product.id}")
+            continue
+        
+        # Immediate ones are queued right away so check_scheduled_rules doesn't dispatch them a second time
+        logger.info(f"Rule {rule.id} matches product {product.id}")
+        new_applications.append(RuleApplication(
+            rule=rule,
+            product=product,
+            status='pending' if rule.delay_minutes > 0 else 'queued',
+            scheduled_for=now + timezone.timedelta(minutes=max(rule.delay_minutes, 0))
+        ))
+    
+    if not new_applications:
+        return
     
-    # If no delay, apply immediately
-    if rule.delay_minutes <= 0:
-        apply_rule.delay(application.id)
+    # ignore_conflicts: the open-application constraint drops any a concurrent sync created first
+    RuleApplication.objects.bulk_create(new_applications, ignore_conflicts=True)
+    logger.info(f"Scheduled {len(new_applications)} rules for product {product.id}")
+    
+    # Apply rules without a delay now; bulk_create with ignore_conflicts doesn't return IDs
+    immediate_rule_ids = [application.rule_id for application in new_applications if application.status == 'queued']
+    if immediate_rule_ids:
+        # scheduled_for=now picks out the rows inserted here, not ones a concurrent sync already sent
+        ids = list(RuleApplication.objects.filter(
+            product=product,
+            rule_id__in=immediate_rule_ids,
+            status='queued',
+            scheduled_for=now
+        ).values_list('id', flat=True))
+        try:
+            apply_rule.chunks([(application_id,) for application_id in ids], RULE_APPLY_CHUNK_SIZE).group().apply_async()
+        except Exception:
+            # Leave them for check_scheduled_rules, which picks up due pending applications
+            logger.exception(f"Could not dispatch rules for product {product.id}, leaving them pending")
+            RuleApplication.objects.filter(id__in=ids, status='queued').update(status='pending')
 
 
 @shared_task
@@ -71,301 +91,71 @@ def apply_rule(rule_application_id):
     Apply a rule to a product.
     """
     from apps.rules.models import RuleApplication
+    from apps.inventory.models import Product, InventoryLog
     from apps.notifications.tasks import send_rule_applied_notification
     
     logger.info(f"Applying rule application {rule_application_id}")
     
     try:
         with transaction.atomic():
-            # Get the rule application
-            application = RuleApplication.objects.select_related('rule', 'product').get(id=rule_application_id)
+            # Lock the application row so a duplicate apply_rule for the same id waits, then sees it applied
+            application = RuleApplication.objects.select_for_update(of=('self',)).select_related(
+                'rule', 'product'
+            ).only(
+                'status', 'applied_at', 'restore_scheduled_for',
+                'rule__name', 'rule__action_type', 'rule__auto_restore', 'rule__restore_after_days',
+                'product__store', 'product__is_visible',
+            ).get(id=rule_application_id)
             
             # Skip if it's already been applied or cancelled
-            if application.status != 'pending':
+            if application.status not in ('pending', 'queued'):
                 logger.info(f"Rule application {rule_application_id} is not pending, status: {application.status}")
                 return {'status': 'skipped', 'reason': f"Status is {application.status}"}
             
             # Apply the rule logic based on rule type
             rule = application.rule
             product = application.product
+            now = timezone.now()
+            was_visible = product.is_visible
             
+            product_fields = {}
+            return_at = None
             if rule.action_type == 'hide_product':
-                product.is_visible = False
-                product.hidden_at = timezone.now()
-                product.save(update_fields=['is_visible', 'hidden_at'])
-                logger.info(f"Product {product.id} hidden by rule {rule.id}")
+                product_fields = {'is_visible': False, 'hidden_at': now}
+                if rule.auto_restore and rule.restore_after_days > 0:
+                    # Calculate return time based on rule
+                    return_at = now + timezone.timedelta(days=rule.restore_after_days)
+                    product_fields['scheduled_return'] = return_at
             
-            elif rule.action_type == 'schedule_return':
-                # Calculate return time based on rule
-                return_at = timezone.now() + timezone.timedelta(days=rule.return_days)
-                
-                product.is_visible = False
-                product.hidden_at = timezone.now()
-                product.scheduled_return = return_at
-                product.save(update_fields=['is_visible', 'hidden_at', 'scheduled_return'])
+            # One UPDATE for the product, one for the application and one INSERT for the log
+            if product_fields:
+                Product.objects.filter(pk=product.pk).update(**product_fields)
                 logger.info(f"Product {product.id} hidden by rule {rule.id}, scheduled return at {return_at}")
-                
-                # Schedule restoration
-                restore_product.apply_async(
-                    args=[application.id],
-                    eta=return_at
-                )
             
-            # Mark the application as applied
             application.status = 'applied'
-            application.applied_at = timezone.now()
-            application.save(update_fields=['status', 'applied_at'])
+            application.applied_at = now
+            application.restore_scheduled_for = return_at
+            application.save(update_fields=['status', 'applied_at', 'restore_scheduled_for'])
             
-            # Create inventory log
-            from apps.inventory.models import InventoryLog
             InventoryLog.objects.create(
-                store=product.store,
+                store_id=product.store_id,
                 product=product,
                 action='rule',
-                previous_status='visible' if product.is_visible else 'hidden',
-                new_status='hidden',
+                previous_status='visible' if was_visible else 'hidden',
+                new_status='hidden' if product_fields else ('visible' if was_visible else 'hidden'),
                 notes=f"Rule '{rule.name}' applied"
             )
             
-            # Send notification if enabled
-            if rule.send_notification:
-                send_rule_applied_notification.delay(application.id)
-            
-            return {
-                'status': 'success',
-                'rule_id': rule.id,
-                'product_id': product.id,
-                'action': rule.action_type
-            }
-    
-    except RuleApplication.DoesNotExist:
-        logger.error(f"Rule application {rule_application_id} not found")
-        return {'status': 'error', 'message': f"Rule application {rule_application_id} not found"}
-    except Exception as e:
-        logger.exception(f"Error applying rule: {str(e)}")
-        return {'status': 'error', 'message': str(e)}
-
-
-@shared_task
-def check_scheduled_rules():
-    """
-    Check for scheduled rules that need to be applied.
-    """
-    from apps.rules.models import RuleApplication
-    
-    logger.info("Checking for scheduled rules to apply")
-    
-    now = timezone.now()
-    
-    # Find all pending applications that are scheduled for now or earlier
-    applications = RuleApplication.objects.filter(
-        status='pending',
-        scheduled_at__lte=now
-    )
-    
-    if not applications.exists():
-        logger.info("No scheduled rules to apply")
-        return {'status': 'success', 'count': 0}
-    
-    logger.info(f"Found {applications.count()} scheduled rules to apply")
-    
-    # Apply each rule
-    count = 0
-    for application in applications:
-        apply_rule.delay(application.id)
-        count += 1
-    
-    return {'status': 'success', 'count': count}
-
-
-@shared_task
-def restore_product(rule_application_id):
-    """
-    Restore a product after a rule has been applied.
-    """
-    from apps.rules.models import RuleApplication
-    
-    logger.info(f"Restoring product for rule application {rule_application_id}")
-    
-    try:
-        with transaction.atomic():
-            # Get the rule application
-            application = RuleApplication.objects.select_related('rule', 'product').get(id=rule_application_id)
-            
-            # Skip if it wasn't applied
-            if application.status != 'applied':
-                logger.info(f"Rule application {rule_application_id} was not applied, status: {application.status}")
-                return {'status': 'skipped', 'reason': f"Status is {application.status}"}
-            
-            product = application.product
-            
-            # Make the product visible again
-            product.is_visible = True
-            product.hidden_at = None
-            product.scheduled_return = None
-            product.save(update_fields=['is_visible', 'hidden_at', 'scheduled_return'])
-            
-            # Create inventory log
-            from apps.inventory.models import InventoryLog
-            InventoryLog.objects.create(
-                store=product.store,
-                product=product,
-                action='schedule',
-                previous_status='hidden',
-                new_status='visible',
-                notes=f"Product restored after rule '{application.rule.name}'"
-            )
-            
-            # Mark the application as restored
-            application.status = 'restored'
-            application.restored_at = timezone.now()
-            application.save(update_fields=['status', 'restored_at'])
-            
-            logger.info(f"Product {product.id} restored after rule {application.rule.id}")
-            
-            return {
-                'status': 'success',
-                'rule_id': application.rule.id,
-                'product_id': product.id
-            }
-    
-    except RuleApplication.DoesNotExist:
-        logger.error(f"Rule application {rule_application_id} not found")
-        return {'status': 'error', 'message': f"Rule application {rule_application_id} not found"}
-    except Exception as e:
-        logger.exception(f"Error restoring product: {str(e)}")
-        return {'status': 'error', 'message': str(e)} 
-from django.utils import timezone
-from django.db import transaction
-import logging
-
-from .utils import rule_matches_product
-
-logger = logging.getLogger(__name__)
-
-def process_out_of_stock_rules(store, product):
-    """
-    Process rules for an out-of-stock product.
-    """
-    from apps.rules.models import Rule
-    
-    logger.info(f"Processing out-of-stock rules for product {product.id} in store {store.id}")
-    
-    # Get all active rules for this store
-    rules = Rule.objects.filter(
-        store=store,
-        is_active=True,
-        trigger_type='out_of_stock'
-    ).order_by('priority')
-    
-    for rule in rules:
-        if rule_matches_product(rule, product):
-            logger.info(f"Rule {rule.id} matches product {product.id}")
-            schedule_rule_application(rule, product)
-
-
-def schedule_rule_application(rule, product):
-    """
-    Schedule a rule application.
-    """
-    from apps.rules.models import RuleApplication
-    
-    # Check if there's already a pending application for this rule and product
-    existing = RuleApplication.objects.filter(
-        rule=rule,
-        product=product,
-        status='pending'
-    ).exists()
-    
-    if existing:
-        logger.info(f"Rule {rule.id} already scheduled for product {product.id}")
-        return
-    
-    # Calculate when to apply the rule based on delay
-    apply_at = timezone.now()
-    if rule.delay_minutes > 0:
-        apply_at = apply_at + timezone.timedelta(minutes=rule.delay_minutes)
-    
-    # Create the rule application
-    application = RuleApplication.objects.create(
-        rule=rule,
-        product=product,
-        status='pending',
-        scheduled_at=apply_at
-    )
-    
-    logger.info(f"Scheduled rule {rule.id} for product {product.id} at {apply_at}")
-    
-    # If no delay, apply immediately
-    if rule.delay_minutes <= 0:
-        apply_rule.delay(application.id)
-
-
-@shared_task
-def apply_rule(rule_application_id):
-    """
-    Apply a rule to a product.
-    """
-    from apps.rules.models import RuleApplication
-    from apps.notifications.tasks import send_rule_applied_notification
-    
-    logger.info(f"Applying rule application {rule_application_id}")
-    
-    try:
-        with transaction.atomic():
-            # Get the rule application
-            application = RuleApplication.objects.select_related('rule', 'product').get(id=rule_application_id)
-            
-            # Skip if it's already been applied or cancelled
-            if application.status != 'pending':
-                logger.info(f"Rule application {rule_application_id} is not pending, status: {application.status}")
-                return {'status': 'skipped', 'reason': f"Status is {application.status}"}
-            
-            # Apply the rule logic based on rule type
-            rule = application.rule
-            product = application.product
-            
-            if rule.action_type == 'hide_product':
-                product.is_visible = False
-                product.hidden_at = timezone.now()
-                product.save(update_fields=['is_visible', 'hidden_at'])
-                logger.info(f"Product {product.id} hidden by rule {rule.id}")
-            
-            elif rule.action_type == 'schedule_return':
-                # Calculate return time based on rule
-                return_at = timezone.now() + timezone.timedelta(days=rule.return_days)
-                
-                product.is_visible = False
-                product.hidden_at = timezone.now()
-                product.scheduled_return = return_at
-                product.save(update_fields=['is_visible', 'hidden_at', 'scheduled_return'])
-                logger.info(f"Product {product.id} hidden by rule {rule.id}, scheduled return at {return_at}")
-                
+            if return_at:
                 # Schedule restoration
                 restore_product.apply_async(
                     args=[application.id],
                     eta=return_at
                 )
             
-            # Mark the application as applied
-            application.status = 'applied'
-            application.applied_at = timezone.now()
-            application.save(update_fields=['status', 'applied_at'])
-            
-            # Create inventory log
-            from apps.inventory.models import InventoryLog
-            InventoryLog.objects.create(
-                store=product.store,
-                product=product,
-                action='rule',
-                previous_status='visible' if product.is_visible else 'hidden',
-                new_status='hidden',
-                notes=f"Rule '{rule.name}' applied"
-            )
-            
             # Send notification if enabled
-            if rule.send_notification:
-                send_rule_applied_notification.delay(application.id)
+            if rule.action_type == 'notify':
+                send_rule_applied_notification.delay(product.store_id, rule.id, product.id)
             
             return {
                 'status': 'success',
@@ -379,6 +169,10 @@ def apply_rule(rule_application_id):
         return {'status': 'error', 'message': f"Rule application {rule_application_id} not found"}
     except Exception as e:
         logger.exception(f"Error applying rule: {str(e)}")
+        # The transaction rolled back; close the application so it no longer blocks the rule and product
+        RuleApplication.objects.filter(
+            id=rule_application_id, status__in=('pending', 'queued')
+        ).update(status='failed', notes=str(e))
         return {'status': 'error', 'message': str(e)}
 
 
@@ -393,23 +187,45 @@ def check_scheduled_rules():
     
     now = timezone.now()
     
-    # Find all pending applications that are scheduled for now or earlier
-    applications = RuleApplication.objects.filter(
-        status='pending',
-        scheduled_at__lte=now
-    )
-    
-    if not applications.exists():
-        logger.info("No scheduled rules to apply")
-        return {'status': 'success', 'count': 0}
+    # A message lost with its worker leaves the row queued; hand those back to be claimed below.
+    # apply_rule locks and re-checks the status, so a late original run is harmless
+    requeued = RuleApplication.objects.filter(
+        status='queued',
+        scheduled_for__lte=now - timezone.timedelta(minutes=RULE_QUEUED_TIMEOUT_MINUTES)
+    ).update(status='pending')
+    if requeued:
+        logger.warning(f"Requeueing {requeued} rule applications that were never applied")
     
-    logger.info(f"Found {applications.count()} scheduled rules to apply")
-    
-    # Apply each rule
     count = 0
-    for application in applications:
-        apply_rule.delay(application.id)
-        count += 1
+    while True:
+        # Claim due applications by flipping them to 'queued'; SKIP LOCKED lets
+        # overlapping runs claim disjoint rows instead of dispatching the same ones
+        with transaction.atomic():
+            ids = list(RuleApplication.objects.select_for_update(skip_locked=True).filter(
+                status='pending',
+                scheduled_for__lte=now
+            ).order_by('scheduled_for').values_list('id', flat=True)[:RULE_CLAIM_BATCH_SIZE])
+            RuleApplication.objects.filter(id__in=ids).update(status='queued')
+        
+        if not ids:
+            break
+        
+        # Publish one message per chunk of applications instead of one per row
+        try:
+            apply_rule.chunks([(application_id,) for application_id in ids], RULE_APPLY_CHUNK_SIZE).group().apply_async()
+        except Exception:
+            # Hand the claim back so the next run retries them
+            RuleApplication.objects.filter(id__in=ids, status='queued').update(status='pending')
+            raise
+        count += len(ids)
+        
+        if len(ids) < RULE_CLAIM_BATCH_SIZE:
+            break
+    
+    if not count:
+        logger.info("No scheduled rules to apply")
+    else:
+        logger.info(f"Dispatched {count} scheduled rules to apply")
     
     return {'status': 'success', 'count': count}
 
@@ -420,13 +236,18 @@ def restore_product(rule_application_id):
     Restore a product after a rule has been applied.
     """
     from apps.rules.models import RuleApplication
+    from apps.inventory.models import Product, InventoryLog
     
     logger.info(f"Restoring product for rule application {rule_application_id}")
     
     try:
         with transaction.atomic():
-            # Get the rule application
-            application = RuleApplication.objects.select_related('rule', 'product').get(id=rule_application_id)
+            # Lock the application row so concurrent restores for the same id run once
+            application = RuleApplication.objects.select_for_update(of=('self',)).select_related(
+                'rule', 'product'
+            ).only(
+                'status', 'rule__name', 'product__store',
+            ).get(id=rule_application_id)
             
             # Skip if it wasn't applied
             if application.status != 'applied':
@@ -435,16 +256,13 @@ def restore_product(rule_application_id):
             
             product = application.product
             
-            # Make the product visible again
-            product.is_visible = True
-            product.hidden_at = None
-            product.scheduled_return = None
-            product.save(update_fields=['is_visible', 'hidden_at', 'scheduled_return'])
+            # Make the product visible again; one UPDATE each for the product and the application
+            Product.objects.filter(pk=product.pk).update(is_visible=True, hidden_at=None, scheduled_return=None)
+            RuleApplication.objects.filter(pk=application.pk).update(status='reversed')
             
             # Create inventory log
-            from apps.inventory.models import InventoryLog
             InventoryLog.objects.create(
-                store=product.store,
+                store_id=product.store_id,
                 product=product,
                 action='schedule',
                 previous_status='hidden',
@@ -452,11 +270,6 @@ def restore_product(rule_application_id):
                 notes=f"Product restored after rule '{application.rule.name}'"
             )
             
-            # Mark the application as restored
-            application.status = 'restored'
-            application.restored_at = timezone.now()
-            application.save(update_fields=['status', 'restored_at'])
-            
             logger.info(f"Product {product.id} restored after rule {application.rule.id}")
             
             return {
@@ -470,4 +283,4 @@ def restore_product(rule_application_id):
         return {'status': 'error', 'message': f"Rule application {rule_application_id} not found"}
     except Exception as e:
         logger.exception(f"Error restoring product: {str(e)}")
-        return {'status': 'error', 'message': str(e)} 
\ No newline at end of file
+        return {'status': 'error', 'message': str(e)}
@@ -1,197 +1,656 @@
 from celery import shared_task
+from django.core.cache import cache
 from django.utils import timezone
-from django.conf import settings
+from django.utils.dateparse import parse_datetime
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
 import logging
-import shopify
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from core.shopify.client import ShopifyClient
+from .utils import get_location_map
 
 logger = logging.getLogger(__name__)
 
+# Rows per INSERT ... ON CONFLICT statement when upserting synced data
+SYNC_BATCH_SIZE = 1000
+
+# Inventory items per inventory levels query; with 10 levels each this stays well under
+# Shopify's 1000-point query cost limit
+INVENTORY_ITEM_BATCH_SIZE = 50
+
+# Inventory level requests in flight at once for a single store
+INVENTORY_FETCH_WORKERS = 5
+
+# Seconds between bulk operation status checks, and how long to wait overall
+BULK_POLL_INTERVAL = 2
+BULK_OPERATION_TIMEOUT = 30 * 60
+
+# Upper bound in seconds on how long one store sync holds its lock
+STORE_SYNC_LOCK_TIMEOUT = BULK_OPERATION_TIMEOUT + 10 * 60
+
+# Times finish_store_sync retries saving a completed export before giving up
+STORE_SYNC_SAVE_RETRIES = 3
+
+# Every product with its variants, run server-side as one bulk operation.
+# Inventory levels are queried separately: bulk queries allow only two levels of nested connections.
+PRODUCTS_BULK_QUERY = """
+{
+  products {
+    edges {
+      node {
+        id
+        title
+        handle
+        status
+        productType
+        vendor
+        publishedAt
+        variants {
+          edges {
+            node {
+              id
+              title
+              price
+              sku
+              barcode
+              compareAtPrice
+              position
+              inventoryItem { id }
+            }
+          }
+        }
+      }
+    }
+  }
+}
+"""
+
+
+# Inventory levels of a batch of inventory items; items at more than 10 locations are
+# paged with INVENTORY_ITEM_LEVELS_QUERY
+INVENTORY_LEVELS_QUERY = """
+query($ids: [ID!]!) {
+  nodes(ids: $ids) {
+    ... on InventoryItem {
+      id
+      inventoryLevels(first: 10) {
+        pageInfo { hasNextPage endCursor }
+        edges { node { available location { id } } }
+      }
+    }
+  }
+}
+"""
+
+INVENTORY_ITEM_LEVELS_QUERY = """
+query($id: ID!, $cursor: String) {
+  inventoryItem(id: $id) {
+    inventoryLevels(first: 50, after: $cursor) {
+      pageInfo { hasNextPage endCursor }
+      edges { node { available location { id } } }
+    }
+  }
+}
+"""
+
+
+def _gid_to_id(gid):
+    """gid://shopify/Product/123 -> 123"""
+    return int(gid.rsplit('/', 1)[-1])
+
+
+def _bulk_operation_key(shop_domain):
+    return f"inventory:bulk_operation:{shop_domain}"
+
+
+def _store_sync_lock_key(store_id):
+    return f"lock:sync_store:{store_id}"
+
+
+def start_products_bulk(client):
+    """
+    Start the bulk operation that exports every product of a store with its variants.
+    
+    Only one bulk query can run per shop. One left behind by an earlier sync of ours
+    is cancelled and the call fails, so the caller retries once it has stopped; one
+    we did not start is never touched.
+    
+    Args:
+        client (ShopifyClient): The Shopify client for the store
+        
+    Returns:
+        str: The bulk operation ID
+    """
+    current = client.get_current_bulk_operation()
+    if current and current['status'] in ('CREATED', 'RUNNING', 'CANCELING'):
+        if current['id'] != cache.get(_bulk_operation_key(client.shop_url)):
+            raise RuntimeError(f"Bulk operation {current['id']} is already running for {client.shop_url}")
+        if current['status'] != 'CANCELING':
+            logger.warning(f"Cancelling orphaned bulk operation {current['id']}")
+            client.cancel_bulk_operation(current['id'])
+        raise RuntimeError(f"Waiting for orphaned bulk operation {current['id']} to stop")
+    
+    operation = client.run_bulk_query(PRODUCTS_BULK_QUERY)
+    if not operation:
+        raise RuntimeError("Could not start the product bulk operation")
+    # Kept past this sync: the operation may outlive it and must be recognised as ours
+    cache.set(_bulk_operation_key(client.shop_url), operation['id'], timeout=None)
+    return operation['id']
+
+
+def wait_for_bulk_operation(client, operation_id):
+    """
+    Block until a bulk operation finishes, for callers outside a worker (sync_data).
+    
+    Returns:
+        dict: The completed BulkOperation, with its result `url`
+    """
+    deadline = time.monotonic() + BULK_OPERATION_TIMEOUT
+    operation = client.get_bulk_operation(operation_id)
+    while operation and operation['status'] in ('CREATED', 'RUNNING'):
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Bulk operation {operation_id} did not finish in time")
+        time.sleep(BULK_POLL_INTERVAL)
+        operation = client.get_bulk_operation(operation_id)
+    
+    if not operation or operation['status'] != 'COMPLETED':
+        raise RuntimeError(f"Bulk operation did not complete: {operation}")
+    return operation
+
+
+def read_products_bulk(client, operation):
+    """
+    Stream the result of a completed product bulk operation.
+    
+    Returns:
+        list: Product records (GraphQL field names) each with a `variants` list
+    """
+    # Variant lines follow their product and point back to it with __parentId
+    products = {}
+    for record in client.iter_bulk_results(operation.get('url')):
+        if '__parentId' in record:
+            products[record['__parentId']]['variants'].append(record)
+        else:
+            record['variants'] = []
+            products[record['id']] = record
+    return list(products.values())
+
+
+def _graphql_data(client, query, variables):
+    """Run a GraphQL query and return its data, raising if Shopify reported errors."""
+    response = client.graphql(query, variables)
+    if not response or response.get('errors') or not response.get('data'):
+        raise RuntimeError(f"GraphQL query failed: {(response or {}).get('errors')}")
+    return response['data']
+
+
+def _fetch_inventory_levels(client, inventory_item_ids):
+    """
+    Fetch every inventory level of up to 50 inventory items, following pagination.
+    
+    Returns:
+        list: (inventory item ID, location ID, available) tuples
+    """
+    data = _graphql_data(client, INVENTORY_LEVELS_QUERY, {
+        'ids': [f"gid://shopify/InventoryItem/{item_id}" for item_id in inventory_item_ids],
+    })
+    inventory_levels = []
+    for node in data['nodes']:
+        if not node:
+            continue
+        item_id = _gid_to_id(node['id'])
+        connection = node['inventoryLevels']
+        while True:
+            inventory_levels.extend(
+                (item_id, _gid_to_id(edge['node']['location']['id']), edge['node']['available'])
+                for edge in connection['edges']
+            )
+            if not connection['pageInfo']['hasNextPage']:
+                break
+            connection = _graphql_data(client, INVENTORY_ITEM_LEVELS_QUERY, {
+                'id': node['id'],
+                'cursor': connection['pageInfo']['endCursor'],
+            })['inventoryItem']['inventoryLevels']
+    return inventory_levels
+
+
 @shared_task
-def sync_product(client, store, product_id):
+def sync_product(store_id, product_id):
+    """
+    Sync a product from Shopify by ID, for callers that only have the IDs.
+    
+    Args:
+        store_id (int): The store ID
+        product_id (int): The Shopify product ID
+        
+    Returns:
+        dict: Summary of operations performed
+    """
+    from apps.accounts.models import ShopifyStore
+    
+    try:
+        store = ShopifyStore.objects.get(id=store_id)
+    except ShopifyStore.DoesNotExist:
+        logger.error(f"Store with ID {store_id} not found for product sync.")
+        return {'status': 'error', 'message': f"Store with ID {store_id} not found"}
+    
+    return sync_product_data(ShopifyClient(store.shop_url, store.access_token), store, product_id)
+
+
+def sync_product_data(client, store, product_id):
     """
     Sync a product from Shopify and manage its inventory status.
+    
+    Variants and inventory levels are written with one bulk upsert each, and
+    every level whose quantity changed gets an InventoryLog row. Tasks that
+    already hold the store and a client call this directly.
+    
+    Args:
+        client (ShopifyClient): The Shopify client for the store
+        store (ShopifyStore): The store the product belongs to
+        product_id (int): The Shopify product ID
+        
+    Returns:
+        dict: Summary of operations performed
+    """
+    from apps.inventory.models import Product, ProductVariant, InventoryLevel, InventoryLog
+    from .rule_tasks import process_out_of_stock_rules
+    
+    # Taken before fetching, so last_synced never claims data newer than what was read
+    now = timezone.now()
+    
+    # Fetch everything from Shopify before opening the transaction, so no row
+    # locks are held across HTTP round trips
+    response = client.get_product(product_id)
+    if not response or 'product' not in response:
+        logger.warning(f"Product {product_id} not found in Shopify for {store.shop_url}")
+        return {'status': 'error', 'message': f"Product {product_id} not found"}
+    product_data = response['product']
+    variants_data = product_data.get('variants', [])
+    # Batched and paged like the store sync; a failed fetch must not read as "no stock"
+    item_ids = [variant_data['inventory_item_id'] for variant_data in variants_data]
+    levels_data = []
+    try:
+        for start in range(0, len(item_ids), INVENTORY_ITEM_BATCH_SIZE):
+            levels_data.extend(
+                {'inventory_item_id': item_id, 'location_id': location_id, 'available': available}
+                for item_id, location_id, available in _fetch_inventory_levels(
+                    client, item_ids[start:start + INVENTORY_ITEM_BATCH_SIZE]
+                )
+            )
+    except Exception as e:
+        logger.error(f"Could not fetch inventory levels of product {product_id} for {store.shop_url}: {str(e)}")
+        return {'status': 'error', 'message': f"Could not fetch inventory levels of product {product_id}"}
+    
+    with transaction.atomic():
+        product, _ = Product.objects.update_or_create(
+            store=store,
+            shopify_id=product_data['id'],
+            defaults={
+                'title': product_data['title'],
+                'handle': product_data['handle'],
+                'status': product_data.get('status', 'active'),
+                'product_type': product_data.get('product_type'),
+                'vendor': product_data.get('vendor'),
+                'published_at': product_data.get('published_at'),
+                'last_synced': now,
+            }
+        )
+        
+        # --- Variants ---
+        ProductVariant.objects.bulk_create(
+            [
+                ProductVariant(
+                    product=product,
+                    shopify_id=variant_data['id'],
+                    title=variant_data['title'],
+                    price=variant_data['price'],
+                    inventory_item_id=variant_data['inventory_item_id'],
+                    sku=variant_data.get('sku') or None,
+                    barcode=variant_data.get('barcode') or None,
+                    compare_at_price=variant_data.get('compare_at_price') or None,
+                    position=variant_data.get('position', 1),
+                )
+                for variant_data in variants_data
+            ],
+            update_conflicts=True,
+            unique_fields=['product', 'shopify_id'],
+            update_fields=['title', 'price', 'inventory_item_id', 'sku', 'barcode', 'compare_at_price',
+                           'position', 'updated_at'],
+        )
+        variants_by_item = dict(
+            ProductVariant.objects.filter(product=product).values_list('inventory_item_id', 'id')
+        )
+        
+        # --- Inventory levels ---
+        locations = get_location_map(store, {level_data['location_id'] for level_data in levels_data})
+        previous = {
+            (variant_id, location_id): available
+            for variant_id, location_id, available in InventoryLevel.objects.filter(
+                variant__product=product
+            ).values_list('variant_id', 'location_id', 'available')
+        }
+        levels = []
+        logs = []
+        for level_data in levels_data:
+            variant_pk = variants_by_item.get(level_data['inventory_item_id'])
+            if variant_pk is None:
+                continue
+            location_pk = locations[level_data['location_id']]
+            available = level_data.get('available') or 0
+            levels.append(InventoryLevel(
+                variant_id=variant_pk,
+                location_id=location_pk,
+                available=available,
+                last_synced=now,
+            ))
+            previous_value = previous.get((variant_pk, location_pk))
+            if previous_value != available:
+                logs.append(InventoryLog(
+                    store=store,
+                    product=product,
+                    variant_id=variant_pk,
+                    location_id=location_pk,
+                    action='sync',
+                    previous_value=previous_value,
+                    new_value=available,
+                ))
+        InventoryLevel.objects.bulk_create(
+            levels,
+            update_conflicts=True,
+            unique_fields=['variant', 'location'],
+            update_fields=['available', 'last_synced', 'updated_at'],
+        )
+        if logs:
+            InventoryLog.objects.bulk_create(logs, batch_size=SYNC_BATCH_SIZE)
+        
+        total_inventory = InventoryLevel.objects.filter(variant__product=product).aggregate(
+            total=Coalesce(Sum('available'), 0)
+        )['total']
+    
+    if total_inventory <= 0:
+        process_out_of_stock_rules(store, product)
+    
+    logger.info(f"Synced product {product.shopify_id} for {store.shop_url}: "
+                f"{len(levels)} levels, {len(logs)} changed, total inventory {total_inventory}")
+    return {
+        'status': 'success',
+        'product_id': product.id,
+        'levels': len(levels),
+        'changed': len(logs),
+        'total_inventory': total_inventory,
+    }
+
+
+def _save_store_products(store, client, all_products, now):
+    """
+    Upsert a store's products, variants and inventory levels from a product bulk export.
+    
+    Args:
+        store (ShopifyStore): The store being synced
+        client (ShopifyClient): The Shopify client for the store
+        all_products (list): Records from read_products_bulk
+        now (datetime): When the sync started; written as last_synced
     """
-    # TODO: Implement this
-    return {'status': 'not_implemented'}
+    from apps.inventory.models import Product, ProductVariant, InventoryLevel
+    
+    products = [
+        Product(
+            store=store,
+            shopify_id=_gid_to_id(product_data['id']),
+            title=product_data['title'],
+            handle=product_data['handle'],
+            status=product_data['status'].lower(),
+            product_type=product_data['productType'],
+            vendor=product_data['vendor'],
+            published_at=product_data['publishedAt'],
+            last_synced=now,
+        )
+        for product_data in all_products
+    ]
+    Product.objects.bulk_create(
+        products,
+        batch_size=SYNC_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['store', 'shopify_id'],
+        update_fields=['title', 'handle', 'status', 'product_type', 'vendor', 'published_at',
+                       'last_synced', 'updated_at'],
+    )
+    synced_product_ids = {product.shopify_id for product in products}
+    product_pks = dict(
+        Product.objects.filter(store=store, shopify_id__in=synced_product_ids).values_list('shopify_id', 'id')
+    )
+    logger.info(f"Upserted {len(products)} products for {store.shop_url}")
+
+    # --- Variants (all products at once) ---
+    variants = []
+    for product_data in all_products:
+        product_pk = product_pks[_gid_to_id(product_data['id'])]
+        for variant_data in product_data['variants']:
+            variants.append(ProductVariant(
+                product_id=product_pk,
+                shopify_id=_gid_to_id(variant_data['id']),
+                title=variant_data['title'],
+                price=variant_data['price'],
+                inventory_item_id=_gid_to_id(variant_data['inventoryItem']['id']),
+                sku=variant_data.get('sku') or None,
+                barcode=variant_data.get('barcode') or None,
+                compare_at_price=variant_data.get('compareAtPrice') or None,
+                position=variant_data.get('position') or 1,
+            ))
+    ProductVariant.objects.bulk_create(
+        variants,
+        batch_size=SYNC_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['product', 'shopify_id'],
+        update_fields=['title', 'price', 'inventory_item_id', 'sku', 'barcode', 'compare_at_price',
+                       'position', 'updated_at'],
+    )
+    synced_variant_ids = {variant.shopify_id for variant in variants}
+    variant_pks = dict(
+        ProductVariant.objects.filter(
+            product__store=store, shopify_id__in=synced_variant_ids
+        ).values_list('shopify_id', 'id')
+    )
+    logger.info(f"Upserted {len(variants)} variants for {store.shop_url}")
+
+    # --- Sync Inventory Levels (requires inventory scope) ---
+    # Fetched for many items per request, with a few requests in flight at once
+    variants_by_item = {variant.inventory_item_id: variant_pks[variant.shopify_id] for variant in variants}
+    item_ids = list(variants_by_item)
+    batches = [
+        item_ids[start:start + INVENTORY_ITEM_BATCH_SIZE]
+        for start in range(0, len(item_ids), INVENTORY_ITEM_BATCH_SIZE)
+    ]
+    fetched_levels = []
+    with ThreadPoolExecutor(max_workers=INVENTORY_FETCH_WORKERS) as executor:
+        futures = {executor.submit(_fetch_inventory_levels, client, batch): batch for batch in batches}
+        for future in as_completed(futures):
+            try:
+                inventory_levels = future.result()
+            except Exception as e:
+                logger.warning(f"Could not sync inventory levels for {len(futures[future])} items: {e}. Check scopes?")
+                continue
+            fetched_levels.extend(
+                level_data for level_data in inventory_levels
+                if level_data[0] in variants_by_item
+            )
+
+    locations = get_location_map(store, {location_id for _, location_id, _ in fetched_levels})
+    levels = {}
+    for item_id, location_id, available in fetched_levels:
+        variant_pk = variants_by_item[item_id]
+        location_pk = locations[location_id]
+        levels[variant_pk, location_pk] = InventoryLevel(
+            variant_id=variant_pk,
+            location_id=location_pk,
+            available=available or 0,
+            last_synced=now,
+        )
+    InventoryLevel.objects.bulk_create(
+        levels.values(),
+        batch_size=SYNC_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['variant', 'location'],
+        update_fields=['available', 'last_synced', 'updated_at'],
+    )
+    logger.info(f"Upserted {len(levels)} inventory levels for {store.shop_url}")
+
+    # Rows this sync did not upsert still carry an older timestamp, so these
+    # updates need no IN (...) list of every synced ID
+    ProductVariant.objects.filter(
+        product__store=store, product__last_synced__gte=now, updated_at__lt=now
+    ).update(
+        updated_at=timezone.now()
+    )
+    logger.debug(f"Updated variants for store {store.id} not in sync list.")
+
+    Product.objects.filter(store=store, last_synced__lt=now).update(
+        updated_at=timezone.now()
+    )
+    logger.info(f"Updated products for store {store.id} not in sync list.")
+
+
+def _complete_store_sync(store, client, operation, now):
+    """Save a completed product bulk operation and mark the store synced."""
+    all_products = read_products_bulk(client, operation)
+    logger.info(f"Fetched {len(all_products)} products from Shopify for {store.shop_url}.")
+    _save_store_products(store, client, all_products, now)
+    
+    # Refresh today's roll-up so the dashboard reads one row
+    try:
+        from apps.analytics.models import DailySummary
+        DailySummary.refresh_for_store(store)
+    except Exception as e:
+        logger.warning(f"Could not refresh daily summary for {store.shop_url}: {e}")
+    
+    # Mark sync as successful
+    store.last_sync_at = timezone.now()
+    store.sync_status = 'success'
+    store.save(update_fields=['last_sync_at', 'sync_status'])
+    logger.info(f"Successfully completed data sync for store: {store.shop_url}")
+    return {'status': 'success', 'message': f"Successfully synced store {store.shop_url}"}
+
+
+def _fail_store_sync(store, message):
+    """Mark a store sync failed and release its lock."""
+    logger.error(f"Sync of {store.shop_url} failed: {message}")
+    store.sync_status = 'failed'
+    store.save(update_fields=['sync_status'])
+    cache.delete(_store_sync_lock_key(store.id))
+    return {'status': 'error', 'message': message}
 
 
 @shared_task(bind=True, max_retries=3, default_retry_delay=60) # Retries on failure
 def sync_store_data(self, store_id):
-    """Celery task to sync products, variants, and inventory for a store."""
+    """
+    Celery task to sync products, variants, and inventory for a store.
+    
+    Starts the product bulk operation and hands it to finish_store_sync, which
+    polls it from the queue so no worker sleeps while Shopify runs the export.
+    Called directly (the sync_data command), the whole sync runs inline.
+    """
     # Import models here to avoid circular imports
     from apps.accounts.models import ShopifyStore
-    from apps.inventory.models import Product, ProductVariant, InventoryLevel
 
     logger.info(f"Starting sync_store_data task for store ID: {store_id}")
+    
+    # Step 1: Get store info
     try:
-        # Step 1: Get store info
-        try:
-            store = ShopifyStore.objects.get(id=store_id)
-            logger.info(f"Store found: {store.shop_url}")
-        except ShopifyStore.DoesNotExist:
-            logger.error(f"Store with ID {store_id} not found for syncing.")
-            return {'status': 'error', 'message': f"Store with ID {store_id} not found"}
+        store = ShopifyStore.objects.get(id=store_id)
+        logger.info(f"Store found: {store.shop_url}")
+    except ShopifyStore.DoesNotExist:
+        logger.error(f"Store with ID {store_id} not found for syncing.")
+        return {'status': 'error', 'message': f"Store with ID {store_id} not found"}
+    
+    # Check if store has an access token
+    if not store.access_token:
+        logger.error(f"Store {store.shop_url} has no access token.")
+        store.sync_status = 'failed'
+        store.save(update_fields=['sync_status'])
+        return {'status': 'error', 'message': f"Store {store.shop_url} has no access token"}
+
+    # Overlapping syncs of one store (install, beat, sync_data) would fight over its single bulk operation.
+    # The lock is held until finish_store_sync saves the result
+    if not cache.add(_store_sync_lock_key(store.id), 1, timeout=STORE_SYNC_LOCK_TIMEOUT):
+        logger.info(f"Store {store.shop_url} is already being synced, skipping")
+        return {'status': 'skipped', 'message': f"Store {store.shop_url} sync already running"}
+
+    # Step 2: Shopify API Client Setup (requests go through the client's pooled keep-alive session)
+    client = ShopifyClient(store.shop_url, store.access_token)
+
+    # Step 3: Start the product export (one bulk operation instead of REST pagination)
+    # last_synced is the time the fetch started, so webhooks fired after it still sync
+    now = timezone.now()
+    try:
+        operation_id = start_products_bulk(client)
         
-        # Check if store has an access token
-        if not store.access_token:
-            logger.error(f"Store {store.shop_url} has no access token.")
-            store.sync_status = 'failed'
-            store.save(update_fields=['sync_status'])
-            return {'status': 'error', 'message': f"Store {store.shop_url} has no access token"}
-
-        # Step 2: Shopify API Client Setup
-        try:
-            logger.info(f"Activating Shopify session for {store.shop_url} with API version {settings.SHOPIFY_API_VERSION}")
-            session = shopify.Session(store.shop_url, settings.SHOPIFY_API_VERSION, store.access_token)
-            shopify.ShopifyResource.activate_session(session)
-            logger.info(f"Shopify API session activated for {store.shop_url}")
-        except Exception as e:
-            logger.error(f"Failed to activate Shopify session for {store.shop_url}: {str(e)}", exc_info=True)
-            store.sync_status = 'failed'
-            store.save(update_fields=['sync_status'])
-            # Retry the task if session activation fails
-            raise self.retry(exc=e)
-
-        # Step 3: Product Fetch
-        try:
-            all_products = []
-            page = shopify.Product.find(limit=250) # Max limit
-            all_products.extend(page)
-            while page.has_next_page():
-                page = page.next_page()
-                all_products.extend(page)
-            
-            logger.info(f"Fetched {len(all_products)} products from Shopify for {store.shop_url}.")
-        except Exception as e:
-            logger.error(f"Error fetching products for {store.shop_url}: {str(e)}", exc_info=True)
-            store.sync_status = 'failed'
-            store.save(update_fields=['sync_status'])
-            raise self.retry(exc=e)
-
-        # Step 4: Process products
-        try:
-            synced_product_ids = set()
-            for product_data in all_products:
-                # Fixed field names to match the actual Product model
-                product, created = Product.objects.update_or_create(
-                    store=store,
-                    shopify_id=product_data.id,
-                    defaults={
-                        'title': product_data.title,
-                        'handle': product_data.handle,
-                        'status': product_data.status,
-                        'product_type': product_data.product_type,
-                        'vendor': product_data.vendor,
-                        # 'tags': product_data.tags,  # Field doesn't exist in model, removed
-                        'published_at': product_data.published_at,
-                        # 'last_synced_at': timezone.now()  # Changed to last_synced
-                        'last_synced': timezone.now()
-                    }
-                )
-                synced_product_ids.add(product.shopify_id)
-                if created:
-                    logger.debug(f"Created Product: {product.title} ({product.shopify_id})")
-                else:
-                    logger.debug(f"Updated Product: {product.title} ({product.shopify_id})")
-
-                # --- Variant and Inventory Sync (per product) ---
-                synced_variant_ids = set()
-                for variant_data in product_data.variants:
-                    # Only include fields that exist in our model
-                    variant_defaults = {
-                        'title': variant_data.title,
-                        'price': variant_data.price,
-                        'inventory_item_id': variant_data.inventory_item_id,
-                    }
-                    
-                    # Only add optional fields if they exist and have values
-                    if hasattr(variant_data, 'sku') and variant_data.sku:
-                        variant_defaults['sku'] = variant_data.sku
-                    
-                    if hasattr(variant_data, 'barcode') and variant_data.barcode:
-                        variant_defaults['barcode'] = variant_data.barcode
-                    
-                    if hasattr(variant_data, 'compare_at_price') and variant_data.compare_at_price:
-                        variant_defaults['compare_at_price'] = variant_data.compare_at_price
-                    
-                    if hasattr(variant_data, 'position'):
-                        variant_defaults['position'] = variant_data.position
-                    
-                    variant, v_created = ProductVariant.objects.update_or_create(
-                        product=product,
-                        shopify_id=variant_data.id,
-                        defaults=variant_defaults
-                    )
-                    synced_variant_ids.add(variant.shopify_id)
-                    if v_created:
-                        logger.debug(f"  Created Variant: {variant.title or variant.shopify_id}")
-                    
-                    # --- Sync Inventory Levels (requires inventory scope) ---
-                    try:
-                        inventory_levels = shopify.InventoryLevel.find(
-                            inventory_item_ids=variant_data.inventory_item_id
-                        )
-                        for level_data in inventory_levels:
-                            # Need to get or create the InventoryLocation
-                            from apps.inventory.models import InventoryLocation
-                            location, _ = InventoryLocation.objects.get_or_create(
-                                store=store,
-                                shopify_id=level_data.location_id,
-                                defaults={'name': f"Location {level_data.location_id}"}
-                            )
-                            
-                            level, l_created = InventoryLevel.objects.update_or_create(
-                                variant=variant,
-                                location=location,  # Use the location object
-                                defaults={
-                                    'available': level_data.available or 0,
-                                    'last_synced': timezone.now()  # Use last_synced not last_synced_at
-                                }
-                            )
-                            if l_created:
-                                 logger.debug(f"    Created InventoryLevel for Loc {level.location.shopify_id}")
-                    except Exception as e:
-                        logger.warning(f"Could not sync inventory level for variant {variant_data.id}: {e}. Check scopes?")
-                
-                # Ensure is_active field is set correctly for updated model
-                ProductVariant.objects.filter(product=product).exclude(shopify_id__in=synced_variant_ids).update(
-                    updated_at=timezone.now()
-                )
-                logger.debug(f"  Updated variants for product {product.shopify_id} not in sync list.")
-            
-            # Ensure is_active field is set correctly for updated model
-            Product.objects.filter(store=store).exclude(shopify_id__in=synced_product_ids).update(
-                updated_at=timezone.now()
-            )
-            logger.info(f"Updated products for store {store.id} not in sync list.")
-        except Exception as e:
-            logger.error(f"Error processing products for {store.shop_url}: {str(e)}", exc_info=True)
-            store.sync_status = 'failed'
-            store.save(update_fields=['sync_status'])
-            raise self.retry(exc=e)
+        if self.request.called_directly:
+            # Nothing else waits on this process, so poll here and save the result
+            operation = wait_for_bulk_operation(client, operation_id)
+            result = _complete_store_sync(store, client, operation, now)
+            cache.delete(_store_sync_lock_key(store.id))
+            return result
+        
+        finish_store_sync.apply_async((store.id, operation_id, now.isoformat()), countdown=BULK_POLL_INTERVAL)
+    except Exception as e:
+        logger.error(f"Error starting sync for {store.shop_url}: {str(e)}", exc_info=True)
+        _fail_store_sync(store, str(e))
+        raise self.retry(exc=e)
+    
+    logger.info(f"Started bulk operation {operation_id} for {store.shop_url}")
+    return {'status': 'started', 'message': f"Started sync of store {store.shop_url}", 'operation_id': operation_id}
 
-        # Step 5: Mark sync as successful
-        store.last_sync_at = timezone.now()
-        store.sync_status = 'success'
-        store.save(update_fields=['last_sync_at', 'sync_status'])
-        logger.info(f"Successfully completed data sync for store: {store.shop_url}")
-        return {'status': 'success', 'message': f"Successfully synced store {store.shop_url}"}
 
+@shared_task(bind=True, max_retries=None, default_retry_delay=60)
+def finish_store_sync(self, store_id, operation_id, started_at, failures=0):
+    """
+    Poll a store's product bulk operation and save the result once it completes.
+    
+    Re-queues itself every BULK_POLL_INTERVAL seconds while the operation runs,
+    and releases the store lock taken by sync_store_data when it is done.
+    
+    Args:
+        store_id (int): The store ID
+        operation_id (str): The bulk operation started by sync_store_data
+        started_at (str): ISO timestamp of when the sync started
+        failures (int): Failed attempts at saving the result so far
+    """
+    from apps.accounts.models import ShopifyStore
+    
+    try:
+        store = ShopifyStore.objects.get(id=store_id)
+    except ShopifyStore.DoesNotExist:
+        cache.delete(_store_sync_lock_key(store_id))
+        logger.error(f"Store with ID {store_id} not found for syncing.")
+        return {'status': 'error', 'message': f"Store with ID {store_id} not found"}
+    
+    client = ShopifyClient(store.shop_url, store.access_token)
+    now = parse_datetime(started_at)
+    
+    # A failed status check (None) is retried like a running operation, up to the deadline
+    operation = client.get_bulk_operation(operation_id)
+    if not operation or operation['status'] in ('CREATED', 'RUNNING'):
+        if timezone.now() - now < timezone.timedelta(seconds=BULK_OPERATION_TIMEOUT):
+            raise self.retry(countdown=BULK_POLL_INTERVAL)
+        return _fail_store_sync(store, f"Bulk operation {operation_id} did not finish in time")
+    if operation['status'] != 'COMPLETED':
+        return _fail_store_sync(store, f"Bulk operation did not complete: {operation}")
+    
+    try:
+        result = _complete_store_sync(store, client, operation, now)
     except Exception as e:
-        logger.error(f"Unexpected error during store sync for ID {store_id}: {str(e)}", exc_info=True)
-        # Optionally update store sync status to 'failed'
-        try:
-            store = ShopifyStore.objects.get(id=store_id)
+        logger.error(f"Error processing products for {store.shop_url}: {str(e)}", exc_info=True)
+        if failures < STORE_SYNC_SAVE_RETRIES:
+            # The result file stays available, so only the save is retried; the lock stays held
             store.sync_status = 'failed'
             store.save(update_fields=['sync_status'])
-        except Exception as inner_e:
-            logger.error(f"Could not update store sync status: {str(inner_e)}")
-        # Retry the task
-        raise self.retry(exc=e)
-    finally:
-        # Deactivate session after use
-        try:
-            shopify.ShopifyResource.clear_session()
-            logger.info(f"Shopify API session cleared")
-        except Exception as e:
-            logger.warning(f"Could not clear Shopify session: {e}") 
\ No newline at end of file
+            raise self.retry(exc=e, kwargs={'failures': failures + 1})
+        _fail_store_sync(store, str(e))
+        raise
+    
+    cache.delete(_store_sync_lock_key(store.id))
+    return result
@@ -1,130 +1,141 @@
 from datetime import datetime
+from functools import lru_cache
 import logging
 
+from django.core.cache import cache
+
 logger = logging.getLogger(__name__)
 
-def get_variant_by_id(client, variant_id):
-    """
-    Get a variant from Shopify by its ID.
-    
-    Args:
-        client (ShopifyClient): The Shopify client
-        variant_id (int): The variant ID
-        
-    Returns:
-        dict: The variant data or None if not found
-    """
-    # Use GraphQL to efficiently query variant data
-    query = """
-    query getVariant($id: ID!) {
-        productVariant(id: $id) {
+# Shopify's nodes() query accepts at most 250 IDs
+VARIANT_LOOKUP_BATCH_SIZE = 250
+
+# Seconds a resolved variant -> product mapping is reused across webhook bursts
+VARIANT_PRODUCT_CACHE_TIMEOUT = 60
+
+VARIANT_PRODUCTS_QUERY = """
+query getVariants($ids: [ID!]!) {
+    nodes(ids: $ids) {
+        ... on ProductVariant {
             id
             product {
                 id
             }
         }
     }
-    """
-    
-    # Format the ID for GraphQL
-    gid = f"gid://shopify/ProductVariant/{variant_id}"
-    
-    result = client.graphql(query, {'id': gid})
-    
-    if result and 'data' in result and 'productVariant' in result['data'] and result['data']['productVariant']:
-        variant = result['data']['productVariant']
-        product_gid = variant['product']['id']
-        # Extract the numeric ID from the GID
-        product_id = product_gid.split('/')[-1]
-        return {'product_id': int(product_id)}
-    
-    return None
+}
+"""
 
 
-def parse_shopify_datetime(datetime_str):
-    """Parse a Shopify datetime string into a Python datetime object."""
-    if not datetime_str:
-        return None
-    
-    try:
-        # Shopify datetime format: 2023-01-01T12:00:00-00:00
-        return datetime.fromisoformat(datetime_str.replace('Z', '+00:00'))
-    except (ValueError, TypeError):
-        return None
+def _variant_product_key(shop_domain, variant_id):
+    return f"variant_product:{shop_domain}:{variant_id}"
 
 
-def rule_matches_product(rule, product):
+def get_variant_by_id(client, variant_id):
     """
-    Check if a rule matches a product based on rule filters.
+    Get a variant from Shopify by its ID.
     
     Args:
-        rule (Rule): The rule to check
-        product (Product): The product to check against
+        client (ShopifyClient): The Shopify client
+        variant_id (int): The variant ID
         
     Returns:
-        bool: True if the rule matches the product, False otherwise
+        dict: The variant data or None if not found
     """
-    # Check product type filter
-    if rule.product_type_filter and rule.product_type_filter != product.product_type:
-        return False
-    
-    # Check vendor filter
-    if rule.vendor_filter and rule.vendor_filter != product.vendor:
-        return False
-    
-    # TODO: Implement tag and collection filters when those are available
+    product_id = get_variant_products(client, [variant_id]).get(int(variant_id))
+    if product_id:
+        return {'product_id': product_id}
     
-    return True 
-import logging
+    return None
 
-logger = logging.getLogger(__name__)
 
-def get_variant_by_id(client, variant_id):
+def get_variant_products(client, variant_ids):
     """
-    Get a variant from Shopify by its ID.
+    Look up the parent product of many variants with one GraphQL query per 250 IDs.
+    
+    Results are cached per shop for VARIANT_PRODUCT_CACHE_TIMEOUT seconds, so
+    the repeated webhooks Shopify sends for one variant cost a single lookup.
     
     Args:
         client (ShopifyClient): The Shopify client
-        variant_id (int): The variant ID
+        variant_ids (list): Shopify variant IDs
         
     Returns:
-        dict: The variant data or None if not found
+        dict: Variant ID -> product ID, for the variants that were found
+        
+    Raises:
+        RuntimeError: If Shopify did not answer a lookup
     """
-    # Use GraphQL to efficiently query variant data
-    query = """
-    query getVariant($id: ID!) {
-        productVariant(id: $id) {
-            id
-            product {
-                id
-            }
-        }
-    }
+    keys = {_variant_product_key(client.shop_url, i): int(i) for i in variant_ids}
+    products = {keys[key]: product_id for key, product_id in cache.get_many(keys).items()}
+    variant_ids = [i for i in keys.values() if i not in products]
+    found = {}
+    for start in range(0, len(variant_ids), VARIANT_LOOKUP_BATCH_SIZE):
+        # Format the IDs for GraphQL
+        gids = [f"gid://shopify/ProductVariant/{i}" for i in variant_ids[start:start + VARIANT_LOOKUP_BATCH_SIZE]]
+        result = client.graphql(VARIANT_PRODUCTS_QUERY, {'ids': gids})
+        if not result or not result.get('data'):
+            # Throttled or failed; raise rather than report the variants as unknown
+            raise RuntimeError(f"Variant lookup failed: {(result or {}).get('errors')}")
+        
+        # Unknown IDs come back as null nodes
+        for node in result['data'].get('nodes') or []:
+            if node and node.get('product'):
+                # Extract the numeric IDs from the GIDs
+                found[int(node['id'].split('/')[-1])] = int(node['product']['id'].split('/')[-1])
+    
+    # Only hits are cached; a miss may be a variant created moments ago
+    if found:
+        cache.set_many(
+            {_variant_product_key(client.shop_url, i): product_id for i, product_id in found.items()},
+            VARIANT_PRODUCT_CACHE_TIMEOUT,
+        )
+    products.update(found)
+    return products
+
+
+def get_location_map(store, location_ids):
     """
+    Map Shopify location IDs to InventoryLocation primary keys for a store.
     
-    # Format the ID for GraphQL
-    gid = f"gid://shopify/ProductVariant/{variant_id}"
-    
-    result = client.graphql(query, {'id': gid})
+    Locations not seen before are created in one bulk insert, so callers can
+    look up every ID without a query per inventory level.
     
-    if result and 'data' in result and 'productVariant' in result['data'] and result['data']['productVariant']:
-        variant = result['data']['productVariant']
-        product_gid = variant['product']['id']
-        # Extract the numeric ID from the GID
-        product_id = product_gid.split('/')[-1]
-        return {'product_id': int(product_id)}
-    
-    return None
+    Args:
+        store (ShopifyStore): The store the locations belong to
+        location_ids (set): Shopify location IDs
+        
+    Returns:
+        dict: Shopify location ID -> InventoryLocation ID
+    """
+    from apps.inventory.models import InventoryLocation
+    
+    locations = dict(
+        InventoryLocation.objects.filter(store=store, shopify_id__in=location_ids).values_list('shopify_id', 'id')
+    )
+    missing = set(location_ids) - locations.keys()
+    if missing:
+        # ignore_conflicts: a concurrent sync may create the same location first
+        InventoryLocation.objects.bulk_create(
+            [InventoryLocation(store=store, shopify_id=i, name=f"Location {i}") for i in missing],
+            ignore_conflicts=True,
+        )
+        locations.update(
+            InventoryLocation.objects.filter(store=store, shopify_id__in=missing).values_list('shopify_id', 'id')
+        )
+    return locations
 
 
+@lru_cache(maxsize=4096)
 def parse_shopify_datetime(datetime_str):
-    """Parse a Shopify datetime string into a Python datetime object."""
+    """Parse a Shopify datetime string into a Python datetime object (cached, datetimes are immutable)."""
     if not datetime_str:
         return None
     
     try:
-        # Shopify datetime format: 2023-01-01T12:00:00-00:00
-        return datetime.fromisoformat(datetime_str.replace('Z', '+00:00'))
+        # Shopify datetime format: 2023-01-01T12:00:00-00:00, sometimes with a Z suffix
+        if datetime_str[-1] == 'Z':
+            datetime_str = datetime_str[:-1] + '+00:00'
+        return datetime.fromisoformat(datetime_str)
     except (ValueError, TypeError):
         return None
 
@@ -150,4 +161,4 @@ def rule_matches_product(rule, product):
     
     # TODO: Implement tag and collection filters when those are available
     
-    return True 
\ No newline at end of file
+    return True
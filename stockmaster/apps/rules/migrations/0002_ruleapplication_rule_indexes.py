@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-16 13:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rules', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ruleapplication',
+            index=models.Index(fields=['rule', 'status'], name='ruleapp_rule_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ruleapplication',
+            index=models.Index(fields=['rule', 'applied_at'], name='ruleapp_rule_applied_idx'),
+        ),
+    ]
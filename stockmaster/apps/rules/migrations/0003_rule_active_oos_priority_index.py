@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-16 13:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rules', '0002_ruleapplication_rule_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='rule',
+            index=models.Index(condition=models.Q(('is_active', True), ('trigger_type', 'out_of_stock')), fields=['store', '-priority'], name='rule_active_oos_priority_idx'),
+        ),
+    ]
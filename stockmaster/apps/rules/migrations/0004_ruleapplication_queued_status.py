@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-16 13:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rules', '0003_rule_active_oos_priority_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ruleapplication',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('queued', 'Queued'), ('applied', 'Applied'), ('reversed', 'Reversed'), ('failed', 'Failed')], default='pending', help_text='Current status of the rule application', max_length=50),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-16 13:34
+
+from django.db import migrations, models
+
+
+def fail_duplicate_open_applications(apps, schema_editor):
+    """Keep the newest open application per rule and product so the constraint can be added."""
+    RuleApplication = apps.get_model('rules', 'RuleApplication')
+    open_applications = RuleApplication.objects.filter(status__in=['pending', 'queued'])
+    duplicates = (
+        open_applications.values('rule_id', 'product_id')
+        .annotate(newest=models.Max('id'), total=models.Count('id'))
+        .filter(total__gt=1)
+    )
+    for row in duplicates:
+        open_applications.filter(rule_id=row['rule_id'], product_id=row['product_id']).exclude(
+            id=row['newest']
+        ).update(status='failed')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rules', '0004_ruleapplication_queued_status'),
+    ]
+
+    operations = [
+        migrations.RunPython(fail_duplicate_open_applications, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ruleapplication',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'queued'])), fields=('rule', 'product'), name='ruleapp_one_open_per_rule_product'),
+        ),
+    ]
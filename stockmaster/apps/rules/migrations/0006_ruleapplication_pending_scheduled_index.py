@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-16 13:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rules', '0005_ruleapplication_one_open_constraint'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ruleapplication',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['scheduled_for'], name='ruleapp_pending_sched_idx'),
+        ),
+    ]
@@ -61,6 +61,12 @@ class Rule(models.Model):
         indexes = [
             models.Index(fields=['store', 'is_active']),
             models.Index(fields=['store', 'trigger_type']),
+            # Active out-of-stock rules in priority order, as read on every sync of an empty product
+            models.Index(
+                fields=['store', '-priority'],
+                name='rule_active_oos_priority_idx',
+                condition=models.Q(is_active=True, trigger_type='out_of_stock'),
+            ),
         ]
     
     def __str__(self):
@@ -72,6 +78,7 @@ class RuleApplication(models.Model):
     
     STATUS_CHOICES = (
         ('pending', 'Pending'),
+        ('queued', 'Queued'),
         ('applied', 'Applied'),
         ('reversed', 'Reversed'),
         ('failed', 'Failed'),
@@ -97,6 +104,23 @@ class RuleApplication(models.Model):
             models.Index(fields=['status']),
             models.Index(fields=['scheduled_for']),
             models.Index(fields=['restore_scheduled_for']),
+            # Per-store dashboard counts reach applications through their rule
+            models.Index(fields=['rule', 'status'], name='ruleapp_rule_status_idx'),
+            models.Index(fields=['rule', 'applied_at'], name='ruleapp_rule_applied_idx'),
+            # Due delayed applications, as claimed by every check_scheduled_rules run
+            models.Index(
+                fields=['scheduled_for'],
+                name='ruleapp_pending_sched_idx',
+                condition=models.Q(status='pending'),
+            ),
+        ]
+        constraints = [
+            # At most one application per rule and product waiting to be applied
+            models.UniqueConstraint(
+                fields=['rule', 'product'],
+                condition=models.Q(status__in=['pending', 'queued']),
+                name='ruleapp_one_open_per_rule_product',
+            ),
         ]
     
     def __str__(self):
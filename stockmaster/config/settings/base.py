@@ -166,6 +166,23 @@ TEMPLATE_CONTEXT_PROCESSORS = [
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Cache Configuration
+# Redis-backed default cache, also used as the session store below.
+# Set REDIS_CACHE_LOCATION to a unix socket (e.g. unix:///var/run/redis/redis.sock?db=1)
+# when Redis runs on the same host to skip the TCP stack.
+CACHES = {
+    'default': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': os.getenv(
+            'REDIS_CACHE_LOCATION',
+            f"redis://{os.getenv('REDIS_HOST', 'localhost')}:{os.getenv('REDIS_PORT', '6379')}/1",
+        ),
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+        },
+    }
+}
+
 # Celery Configuration
 CELERY_BROKER_URL = f"redis://{os.getenv('REDIS_HOST', 'localhost')}:{os.getenv('REDIS_PORT', '6379')}/0"
 CELERY_RESULT_BACKEND = 'django-db'
@@ -173,6 +190,10 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_TASK_ROUTES = {
+    # Keep bursts of installs from starving the main worker pool
+    'apps.accounts.tasks.post_install_setup': {'queue': 'webhooks'},
+}
 
 # Shopify Configuration
 SHOPIFY_CLIENT_ID = os.getenv('SHOPIFY_CLIENT_ID')
@@ -299,7 +320,9 @@ LOGOUT_REDIRECT_URL = '/accounts/login/'
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 
 # Additional session settings for Shopify embedded apps
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+# Sessions live in Redis so the OAuth state/shop round trips never touch django_session
+SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
+SESSION_CACHE_ALIAS = 'default'
 SESSION_COOKIE_AGE = 86400 * 7  # 1 week in seconds
 
 # Application specific settings
@@ -3,7 +3,7 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from django.views.generic import TemplateView
-from apps.accounts.views import AuthCallbackView
+from apps.accounts.views import auth_callback
 from core.webhooks.views import AppUninstalledWebhook
 
 urlpatterns = [
@@ -16,7 +16,7 @@ urlpatterns = [
     # Use 'auth_app' namespace to avoid collision
     path('auth/', include('apps.accounts.urls', namespace='auth_app')),
     # Add specific auth callback route that's whitelisted in Shopify
-    path('auth/callback/', AuthCallbackView.as_view(), name='auth_callback'),
+    path('auth/callback/', auth_callback, name='auth_callback'),
     # Enable previously disabled apps
     # path('api/', include('apps.api.urls')),
     path('analytics/', include('apps.analytics.urls')),
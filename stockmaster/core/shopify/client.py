@@ -1,5 +1,6 @@
 import json
 import requests
+from requests.adapters import HTTPAdapter
 from urllib.parse import urlencode
 import hmac
 import hashlib
@@ -8,6 +9,52 @@ import time
 from django.conf import settings
 from core.utils.logger import logger
 
+# Shared keep-alive connection pool for all Shopify API calls
+_SESSION = requests.Session()
+_SESSION.mount('https://', HTTPAdapter(pool_connections=32, pool_maxsize=64))
+
+# App secret as bytes for webhook HMAC checks, encoded once at import
+_HMAC_SECRET = (settings.SHOPIFY_CLIENT_SECRET or '').encode('utf-8')
+
+# Attempts for throttled (429) and server error (5xx) responses, and the first backoff in seconds
+MAX_RETRIES = 5
+RETRY_BACKOFF_BASE = 0.5
+
+# The REST leaky bucket drains 2 calls per second; pause when this few calls are left
+REST_LEAK_RATE = 2
+CALL_LIMIT_HEADROOM = 2
+
+# Bulk operation queries, built once at import
+_BULK_RUN_MUTATION = (
+    "mutation($query: String!) { bulkOperationRunQuery(query: $query) "
+    "{ bulkOperation { id status } userErrors { field message } } }"
+)
+_BULK_OPERATION_QUERY = (
+    "query($id: ID!) { node(id: $id) "
+    "{ ... on BulkOperation { id status errorCode objectCount url } } }"
+)
+_CURRENT_BULK_OPERATION_QUERY = "{ currentBulkOperation { id status errorCode objectCount url } }"
+_BULK_CANCEL_MUTATION = (
+    "mutation($id: ID!) { bulkOperationCancel(id: $id) "
+    "{ bulkOperation { id status } userErrors { field message } } }"
+)
+
+
+def retry_delay(attempt, retry_after=None):
+    """Seconds to wait before retrying: Shopify's Retry-After when sent, otherwise exponential backoff."""
+    try:
+        return float(retry_after)
+    except (TypeError, ValueError):
+        return RETRY_BACKOFF_BASE * 2 ** attempt
+
+
+def _wait_for_call_limit(response):
+    """Pause for one leak interval when X-Shopify-Shop-Api-Call-Limit (e.g. 39/40) is nearly used up."""
+    used, _, limit = response.headers.get('X-Shopify-Shop-Api-Call-Limit', '').partition('/')
+    if used.isdigit() and limit.isdigit() and int(limit) - int(used) <= CALL_LIMIT_HEADROOM:
+        time.sleep(1 / REST_LEAK_RATE)
+
+
 class ShopifyClient:
     """
     Client for interacting with the Shopify API.
@@ -62,7 +109,7 @@ class ShopifyClient:
         }
         
         try:
-            response = requests.post(url, json=payload)
+            response = _SESSION.post(url, json=payload)
             response_data = response.json()
             
             if 'access_token' in response_data:
@@ -88,7 +135,7 @@ class ShopifyClient:
             bool: True if the webhook is valid, False otherwise
         """
         digest = hmac.new(
-            settings.SHOPIFY_CLIENT_SECRET.encode('utf-8'),
+            _HMAC_SECRET,
             data,
             hashlib.sha256
         ).digest()
@@ -108,6 +155,30 @@ class ShopifyClient:
         self.access_token = access_token
         self.base_url = f"https://{shop_url}/admin/api/{settings.SHOPIFY_API_VERSION}"  # Use version from settings
     
+    def _send(self, method, url, session=None, **kwargs):
+        """
+        Send an HTTP request, retrying throttled (429) and server error (5xx) responses.
+        
+        Args:
+            method (str): HTTP method
+            url (str): Full request URL
+            session (requests.Session, optional): Session to send the request through
+            **kwargs: Passed on to requests
+            
+        Returns:
+            requests.Response: The last response received
+        """
+        for attempt in range(MAX_RETRIES):
+            response = (session or _SESSION).request(method, url, **kwargs)
+            if (response.status_code != 429 and response.status_code < 500) or attempt == MAX_RETRIES - 1:
+                break
+            delay = retry_delay(attempt, response.headers.get('Retry-After'))
+            logger.warning(f"Shopify returned {response.status_code}. Retrying after {delay} seconds")
+            time.sleep(delay)
+        
+        _wait_for_call_limit(response)
+        return response
+    
     def _request(self, method, endpoint, data=None, params=None):
         """
         Make a request to the Shopify API.
@@ -130,24 +201,13 @@ class ShopifyClient:
         url = f"{self.base_url}{endpoint}"
         
         try:
-            if method == 'GET':
-                response = requests.get(url, headers=headers, params=params)
-            elif method == 'POST':
-                response = requests.post(url, headers=headers, data=json.dumps(data), params=params)
-            elif method == 'PUT':
-                response = requests.put(url, headers=headers, data=json.dumps(data), params=params)
-            elif method == 'DELETE':
-                response = requests.delete(url, headers=headers, params=params)
+            if method in ('GET', 'DELETE'):
+                response = self._send(method, url, headers=headers, params=params)
+            elif method in ('POST', 'PUT'):
+                response = self._send(method, url, headers=headers, data=json.dumps(data), params=params)
             else:
                 raise ValueError(f"Unsupported HTTP method: {method}")
             
-            # Handle rate limiting
-            if response.status_code == 429:
-                retry_after = int(response.headers.get('Retry-After', 10))
-                logger.warning(f"Rate limited. Retrying after {retry_after} seconds")
-                time.sleep(retry_after)
-                return self._request(method, endpoint, data, params)
-            
             response.raise_for_status()
             return response.json()
             
@@ -214,6 +274,101 @@ class ShopifyClient:
     def delete_webhook(self, webhook_id):
         """Delete a webhook"""
         return self._request('DELETE', f'/webhooks/{webhook_id}.json')
+
+    def create_webhooks_bulk(self, topics_and_addrs):
+        """
+        Create several webhook subscriptions in a single GraphQL request.
+
+        Args:
+            topics_and_addrs (dict): Mapping of REST topic (e.g. 'app/uninstalled') to callback URL
+
+        Returns:
+            dict: Mapping of topic to the numeric webhook ID for each subscription created
+        """
+        if not topics_and_addrs:
+            return {}
+
+        topics = list(topics_and_addrs)
+        params = []
+        mutations = []
+        variables = {}
+        for i, topic in enumerate(topics):
+            params.append(f"$topic{i}: WebhookSubscriptionTopic!, $sub{i}: WebhookSubscriptionInput!")
+            mutations.append(
+                f"wh{i}: webhookSubscriptionCreate(topic: $topic{i}, webhookSubscription: $sub{i}) "
+                "{ webhookSubscription { id } userErrors { field message } }"
+            )
+            # GraphQL topics are enum values: app/uninstalled -> APP_UNINSTALLED
+            variables[f'topic{i}'] = topic.replace('/', '_').upper()
+            variables[f'sub{i}'] = {'callbackUrl': topics_and_addrs[topic], 'format': 'JSON'}
+
+        query = f"mutation({', '.join(params)}) {{ {' '.join(mutations)} }}"
+        response = self.graphql(query, variables)
+        if not response or 'data' not in response or not response['data']:
+            logger.error(f"Bulk webhook creation failed: {response}")
+            return {}
+
+        created = {}
+        for i, topic in enumerate(topics):
+            result = response['data'].get(f'wh{i}') or {}
+            if result.get('userErrors'):
+                logger.error(f"Error creating webhook for {topic}: {result['userErrors']}")
+                continue
+            subscription = result.get('webhookSubscription')
+            if subscription:
+                # gid://shopify/WebhookSubscription/123 -> 123, matching REST webhook IDs
+                created[topic] = subscription['id'].rsplit('/', 1)[-1]
+        return created
+
+    # Bulk operation methods
+    def run_bulk_query(self, query):
+        """
+        Start a bulk operation that runs `query` server-side.
+        
+        Args:
+            query (str): The GraphQL query to run, without the bulkOperationRunQuery wrapper
+            
+        Returns:
+            dict: The BulkOperation ({'id', 'status'}) or None if it could not be started
+        """
+        response = self.graphql(_BULK_RUN_MUTATION, {'query': query})
+        result = ((response or {}).get('data') or {}).get('bulkOperationRunQuery') or {}
+        if result.get('userErrors') or not result.get('bulkOperation'):
+            logger.error(f"Error starting bulk operation: {result.get('userErrors') or response}")
+            return None
+        return result['bulkOperation']
+    
+    def get_bulk_operation(self, operation_id):
+        """Get the status and result URL of a bulk operation"""
+        response = self.graphql(_BULK_OPERATION_QUERY, {'id': operation_id})
+        return ((response or {}).get('data') or {}).get('node')
+    
+    def get_current_bulk_operation(self):
+        """Get the shop's most recent bulk query operation started by this app"""
+        response = self.graphql(_CURRENT_BULK_OPERATION_QUERY)
+        return ((response or {}).get('data') or {}).get('currentBulkOperation')
+    
+    def cancel_bulk_operation(self, operation_id):
+        """Cancel a running bulk operation"""
+        return self.graphql(_BULK_CANCEL_MUTATION, {'id': operation_id})
+    
+    def iter_bulk_results(self, url):
+        """
+        Stream the JSONL result file of a completed bulk operation.
+        
+        Args:
+            url (str): The operation's result URL (None when it matched no objects)
+            
+        Yields:
+            dict: One decoded record per line; nested records carry a `__parentId`
+        """
+        if not url:
+            return
+        with _SESSION.get(url, stream=True) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if line:
+                    yield json.loads(line)
     
     # GraphQL API method
     def graphql(self, query, variables=None):
@@ -229,10 +384,36 @@ class ShopifyClient:
             payload['variables'] = variables
             
         try:
-            response = requests.post(url, headers=headers, json=payload)
+            response = self._send('POST', url, headers=headers, json=payload)
+            response.raise_for_status()
+            return response.json()
+            
+        except requests.exceptions.RequestException as e:
+            logger.error(f"GraphQL request error: {str(e)}")
+            return None
+    
+    def graphql_raw(self, body, session=None):
+        """
+        Execute a GraphQL request from a pre-serialized JSON body.
+        
+        Args:
+            body (bytes): JSON-encoded request payload ({"query": ..., "variables": ...})
+            session (requests.Session, optional): Session to send the request through
+            
+        Returns:
+            dict: Response data or None if an error occurs
+        """
+        url = f"https://{self.shop_url}/admin/api/{settings.SHOPIFY_API_VERSION}/graphql.json"
+        headers = {
+            'X-Shopify-Access-Token': self.access_token,
+            'Content-Type': 'application/json'
+        }
+        
+        try:
+            response = self._send('POST', url, session=session, headers=headers, data=body)
             response.raise_for_status()
             return response.json()
             
         except requests.exceptions.RequestException as e:
             logger.error(f"GraphQL request error: {str(e)}")
-            return None 
\ No newline at end of file
+            return None
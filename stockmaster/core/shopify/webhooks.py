@@ -0,0 +1,17 @@
+from django.conf import settings
+
+# Webhooks every installed store must have
+WEBHOOK_TOPICS = (
+    'app/uninstalled',
+    'products/update',
+    'inventory_levels/update',
+)
+
+_BASE = settings.APP_URL.rstrip('/') + '/webhooks/'
+
+# Callback URL for each topic, matching the routes in config/urls.py and core/webhooks/urls.py
+WEBHOOK_ADDRESSES = {
+    # app/uninstalled -> /webhooks/app_uninstalled; other topics keep their path
+    topic: _BASE + (topic.replace('/', '_') if topic == 'app/uninstalled' else topic)
+    for topic in WEBHOOK_TOPICS
+}
@@ -1,4 +1,8 @@
+import atexit
 import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener
 
 # Create a logger for the application
 logger = logging.getLogger('stockmaster')
@@ -15,8 +19,27 @@ formatter = logging.Formatter(
 console_handler = logging.StreamHandler()
 console_handler.setFormatter(formatter)
 
+# Request threads only enqueue records; a background listener thread does the
+# (possibly blocking) writes to the real handlers
+queue_handler = QueueHandler(queue.SimpleQueue())
+listener = QueueListener(queue_handler.queue, console_handler, respect_handler_level=True)
+listener.start()
+atexit.register(lambda: listener.stop())
+
+
+def _restart_listener_in_child():
+    """Forked workers (gunicorn, celery prefork) don't inherit the listener thread; start a fresh one."""
+    global listener
+    queue_handler.queue = queue.SimpleQueue()
+    listener = QueueListener(queue_handler.queue, console_handler, respect_handler_level=True)
+    listener.start()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_listener_in_child)
+
 # Add the handler to the logger
-logger.addHandler(console_handler)
+logger.addHandler(queue_handler)
 
 # Set the default log level (can be overridden by settings)
-logger.setLevel(logging.INFO)
\ No newline at end of file
+logger.setLevel(logging.INFO)
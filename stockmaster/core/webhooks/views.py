@@ -7,8 +7,9 @@ from django.conf import settings
 
 from core.shopify.client import ShopifyClient
 from core.utils.logger import logger
-from apps.inventory.tasks import process_inventory_update
+from apps.inventory.tasks import process_inventory_update, queue_variant_update
 from apps.accounts.models import ShopifyStore
+from apps.inventory.models import ProductVariant
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -47,6 +48,11 @@ class ShopifyWebhookView(View):
             logger.error(f"Error processing webhook: {str(e)}")
             return HttpResponse(status=500)
     
+    @property
+    def triggered_at(self):
+        """When Shopify fired this webhook (ISO 8601), or None."""
+        return self.request.headers.get('X-Shopify-Triggered-At')
+    
     def process_webhook(self, shop_domain, data):
         """Process the webhook data. Must be implemented by subclasses."""
         raise NotImplementedError("Subclasses must implement process_webhook")
@@ -65,8 +71,9 @@ class ProductUpdateWebhook(ShopifyWebhookView):
         for variant in variants:
             inventory_quantity = variant.get('inventory_quantity', 0)
             if inventory_quantity <= 0:
-                # Schedule inventory update processing
-                process_inventory_update.delay(shop_domain, product_id, variant.get('id'))
+                # Schedule inventory update processing; one sync covers every variant of the product
+                process_inventory_update.delay(shop_domain, product_id, variant.get('id'), self.triggered_at)
+                break
 
 
 class InventoryLevelUpdateWebhook(ShopifyWebhookView):
@@ -83,6 +90,15 @@ class InventoryLevelUpdateWebhook(ShopifyWebhookView):
             # Find associated product
             try:
                 store = ShopifyStore.objects.get(shop_url=shop_domain)
+                
+                # Synced variants resolve to their product with an index lookup instead of API calls
+                product_id = ProductVariant.objects.filter(
+                    product__store=store, inventory_item_id=inventory_item_id
+                ).values_list('product__shopify_id', flat=True).first()
+                if product_id:
+                    process_inventory_update.delay(shop_domain, product_id, event_at=self.triggered_at)
+                    return
+                
                 # Create a client to get product information
                 client = ShopifyClient(store.shop_url, store.access_token)
                 
@@ -91,8 +107,8 @@ class InventoryLevelUpdateWebhook(ShopifyWebhookView):
                 if inventory_item and 'inventory_item' in inventory_item:
                     variant_id = inventory_item['inventory_item'].get('variant_id')
                     if variant_id:
-                        # Schedule inventory update processing
-                        process_inventory_update.delay(shop_domain, None, variant_id)
+                        # Buffered so a burst of webhooks is resolved with one variant lookup
+                        queue_variant_update(shop_domain, variant_id, self.triggered_at)
             except ShopifyStore.DoesNotExist:
                 logger.error(f"Store not found for domain {shop_domain}")
             except Exception as e:
@@ -112,6 +128,8 @@ class AppUninstalledWebhook(ShopifyWebhookView):
             store.is_active = False
             store.access_token = None  # Clear token for security
             store.save()
+            # Shopify drops the subscriptions on uninstall; forget them so a reinstall re-registers
+            store.webhooks.all().delete()
             logger.info(f"Marked store {shop_domain} as inactive due to uninstallation")
         except ShopifyStore.DoesNotExist:
             logger.warning(f"Store not found for domain {shop_domain} during uninstallation")